@@ -0,0 +1,36 @@
+import sys
+import os
+import numpy as np
+
+sys.path.append(os.path.abspath("equity-options"))
+from optionspricing import barone_adesi_whaley, bjerksund_stensland, american_price, binom_price
+
+#-----------------------------------------------------------#
+S = np.array([80.0, 100.0, 120.0])
+K = 100
+T = 0.75  # years
+sigma = 0.3
+q = 0.04  # dividend yield
+n = 2000  # binomial reference
+#-----------------------------------------------------------#
+
+# r = 0: calls on a dividend payer are still exercised early, puts never are.
+# Both approximations should land within 1% of a fine binomial tree
+r = 0.0
+for option_type in ("call", "put"):
+    tree = binom_price(S, K, T, r, sigma, q, n, option_type, american=True)
+    for pricer in (barone_adesi_whaley, bjerksund_stensland):
+        result = pricer(S, K, T, r, sigma, q, option_type)
+        assert np.all(np.isfinite(result.price)), (pricer.__name__, option_type, result.price)
+        assert np.allclose(result.price, tree, rtol=0.01, atol=0.05), (pricer.__name__, option_type, result.price, tree)
+        print(f"r = 0 {option_type:4} {pricer.__name__:20} {result.price} (tree {tree}), boundary {result.boundary}")
+
+# negative rates are unsupported by the approximations and left to the tree
+for method in ("baw", "bjerksund_stensland"):
+    try:
+        american_price(100, K, T, -0.01, sigma, q, "call", method)
+    except ValueError as error:
+        print(f"r < 0 {method}: {error}")
+    else:
+        raise AssertionError(f"{method} accepted a negative rate")
+print(f"r < 0 binomial: {american_price(100, K, T, -0.01, sigma, q, 'call', 'binomial', n=500):.4f}")
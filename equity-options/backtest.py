@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from tabulate import tabulate
+
+import marketdata
+from optionbook import position_greeks, OPTION_TYPES, POSITIONS, GREEKS
+from optionstrategies import OptionStrategy
+from realizedvol import RealizedVolatility, TRADING_DAYS
+
+BacktestResult = namedtuple("BacktestResult", ["strategy_name", "daily", "summary"])
+
+# runs an OptionStrategy recipe with a spot of 1 and records its legs instead of
+# pricing them, so strikes come back as multiples of spot
+class _LegRecorder(OptionStrategy):
+    def __init__(self, percent_otm_itm):
+        self.stock_price = 1.0
+        self.percent_otm_itm = percent_otm_itm
+        self.options = []
+        self.strategy_name = ""
+
+    def create_option(self, option_type, strike_price, position='long'):
+        return option_type, strike_price, position
+
+def strategy_legs(recipe, percent_otm_itm):
+    recorder = _LegRecorder(percent_otm_itm)
+    legs = getattr(recorder, recipe)()
+    return legs, recorder.strategy_name
+
+# opens the recipe (e.g. "iron_condor") at the close of start with strikes set off
+# that day's spot and expiry T years out, marks it to Black-Scholes every close at
+# that day's spot and trailing close-to-close vol, and closes it for a fresh one
+# every `hold` trading days. The history is loaded once and all days are priced in
+# one broadcast call, so P&L row i is mark(i) - mark(i - 1) of the position held over day i.
+def backtest(ticker, recipe, percent_otm_itm, T, r, start, end=None, hold=1, quantity=1, lookback=TRADING_DAYS):
+    legs, strategy_name = strategy_legs(recipe, percent_otm_itm)
+    option_type = np.array([OPTION_TYPES[leg_type] for leg_type, _, _ in legs])
+    moneyness = np.array([strike for _, strike, _ in legs])
+    weight = np.array([POSITIONS[position] for _, _, position in legs]) * quantity
+
+    # enough history before start for the first vol estimate
+    warmup = pd.to_datetime(start) - pd.Timedelta(days=int(lookback * 365 / TRADING_DAYS) + 14)
+    hist = marketdata.history(ticker, end, start=warmup)
+    estimator = RealizedVolatility().update(hist)
+    dates = hist.index.tz_localize(None) if hist.index.tz is not None else hist.index
+    days = np.flatnonzero(dates >= pd.to_datetime(start))
+    if len(days) < 2:
+        raise ValueError(f"Need at least two trading days of {ticker} history from {start}")
+
+    dates = dates[days]
+    spot = hist['Close'].values[days]
+    vol = np.array([estimator.close_to_close(lookback, end=date) for date in dates])
+    q = marketdata.dividend_yield(ticker)
+    years = (dates - dates[0]).days.values / 365
+
+    now = np.arange(1, len(days))
+    opened = (now - 1) // hold * hold
+    strikes = spot[opened, None] * moneyness
+
+    def mark(day):
+        return position_greeks(option_type, spot[day, None], strikes, T - (years[day] - years[opened])[:, None],
+                               r, vol[day, None], q)
+
+    current, previous = mark(now), mark(now - 1)
+    pnl = (current["price"] - previous["price"]) @ weight
+
+    daily = pd.DataFrame({"Spot": spot[now], "Vol": vol[now], "Value": current["price"] @ weight,
+                          "P&L": pnl, "Cumulative P&L": np.cumsum(pnl)}, index=dates[now])
+    for name in GREEKS:
+        daily[name.capitalize()] = current[name] @ weight
+
+    cumulative = daily["Cumulative P&L"].values
+    entry = previous["price"][now - 1 == opened] @ weight
+    summary = {
+        "Days": len(pnl),
+        "Trades": len(entry),
+        "Total P&L": cumulative[-1],
+        "Mean daily P&L": pnl.mean(),
+        "Daily P&L std": pnl.std(ddof=1) if len(pnl) > 1 else np.nan,
+        "Sharpe (annualized)": pnl.mean() / pnl.std(ddof=1) * np.sqrt(TRADING_DAYS) if len(pnl) > 1 and pnl.std() > 0 else np.nan,
+        "Max drawdown": np.max(np.maximum.accumulate(np.concatenate([[0.0], cumulative]))[1:] - cumulative),
+        "Hit rate": np.mean(pnl > 0),
+        "Mean entry value": entry.mean(),
+    }
+    return BacktestResult(strategy_name, daily, summary)
+
+def print_summary(result):
+    print(f"\n********** BACKTEST: {result.strategy_name} **********\n")
+    rows = [[name, f"{value:.4f}" if isinstance(value, float) else value] for name, value in result.summary.items()]
+    print(tabulate(rows, headers=["Statistic", "Value"], tablefmt="grid"))
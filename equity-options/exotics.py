@@ -2,10 +2,9 @@ import yfinance as yf
 import matplotlib.pyplot as plt
 import numpy as np
 
-from scipy.stats import norm
 from datetime import datetime, timedelta
 
-from optionspricing import div_yield, stock_data, bs_price
+from optionspricing import div_yield, stock_data, bs_price, digital_bs_price
 from montecarlo import monte_carlo_digital, monte_carlo_range_accrual, monte_carlo_asian
 
 class DigitalOption:
@@ -22,25 +21,19 @@ class DigitalOption:
         self.S_0, self.sigma = stock_data(ticker, creation_date)
         self.q = div_yield(ticker)
         self.bs_price = self.digital_option_bs_price()
-        self.mc_price = self.monte_carlo_price()
-
-    def _x(self):
-        x = (np.log(self.K / self.S_0) - (self.r - self.q - 0.5 * self.sigma ** 2) * self.T) / (self.sigma * np.sqrt(self.T))
-        return x
+        self.mc_result = self.monte_carlo_price()
+        self.mc_price = self.mc_result.price
 
     def digital_option_bs_price(self):
-        x = self._x()
-        if self.option_type == "call":
-            return np.exp(-self.r * self.T) * norm.cdf(-x) * self.payoff_amount
-        else:
-            return np.exp(-self.r * self.T) * norm.cdf(x) * self.payoff_amount
+        return digital_bs_price(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.option_type) * self.payoff_amount
 
     def monte_carlo_price(self):
-        return monte_carlo_digital(self.S_0, self.K, self.T, self.r, self.q, self.sigma, self.option_type)
+        return monte_carlo_digital(self.S_0, self.K, self.T, self.r, self.q, self.sigma, self.option_type,
+                                   antithetic=True, control_variate=True)
 
     def price(self):
         print(f"{self.ticker} Digital {self.option_type} with strike {self.K} (Black-Scholes): ${self.bs_price:.2f}")
-        print(f"{self.ticker} Digital {self.option_type} with strike {self.K} (Monte Carlo): ${self.mc_price:.2f}")
+        print(f"{self.ticker} Digital {self.option_type} with strike {self.K} (Monte Carlo): ${self.mc_price:.2f} ± {self.mc_result.std_error:.2f}")
 
 
     def visualize_payoff(self):
@@ -76,11 +69,13 @@ class SinglePeriodRangeAccrual:
         self.S_0, self.sigma = stock_data(ticker)
         self.q = div_yield(ticker)
         self.bs_price = self.range_accrual_bs_price()
-        self.mc_price = self.monte_carlo_price()
+        self.mc_result = self.monte_carlo_price()
+        self.mc_price = self.mc_result.price
 
     def monte_carlo_price(self):
         return monte_carlo_range_accrual(self.S_0, self.K_low, self.K_up,
-                                         self.T, self.r, self.q, self.sigma, self.coupon)
+                                         self.T, self.r, self.q, self.sigma, self.coupon,
+                                         antithetic=True, control_variate=True)
 
     def range_accrual_bs_price(self):
         digital_call_low = DigitalOption(self.ticker, self.r, self.T, self.K_low, option_type="call")
@@ -93,7 +88,7 @@ class SinglePeriodRangeAccrual:
 
     def price(self):
         print(f"{self.ticker} Single-period range accrual {self.K_low}-{self.K_up} (Black-Scholes): ${self.bs_price:.2f}")
-        print(f"{self.ticker} Single-period range accrual {self.K_low}-{self.K_up} (Monte Carlo): ${self.mc_price:.2f}")
+        print(f"{self.ticker} Single-period range accrual {self.K_low}-{self.K_up} (Monte Carlo): ${self.mc_price:.2f} ± {self.mc_result.std_error:.2f}")
 
     def visualize_payoff(self):
         stock_prices = np.linspace(self.K_low * 0.5, self.K_up * 1.5, 1000)
@@ -125,10 +120,12 @@ class AsianOption:
 
         self.S_0, self.sigma = stock_data(ticker)
         self.q = div_yield(ticker)
-        self.mc_price = self.monte_carlo_price()
+        self.mc_result = self.monte_carlo_price()
+        self.mc_price = self.mc_result.price
 
     def monte_carlo_price(self):
-            return monte_carlo_asian(self.S_0, self.K, self.T, self.r, self.q, self.sigma, self.option_type)
+        return monte_carlo_asian(self.S_0, self.K, self.T, self.r, self.q, self.sigma, self.option_type,
+                                 antithetic=True, control_variate=True)
 
     def price(self):
-        print(f"{self.ticker} Asian option with strike {self.K} (Monte Carlo): ${self.mc_price:.2f}")
+        print(f"{self.ticker} Asian option with strike {self.K} (Monte Carlo): ${self.mc_price:.2f} ± {self.mc_result.std_error:.2f}")
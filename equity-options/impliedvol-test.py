@@ -0,0 +1,27 @@
+import sys
+import os
+import numpy as np
+
+sys.path.append(os.path.abspath("equity-options"))
+from optionspricing import implied_volatility, implied_volatility_chain, bs_price
+
+# a chain of random contracts: every vol reported as converged must be the true vol
+rng = np.random.default_rng(1)
+K = rng.uniform(50, 200, 20000)
+T = rng.uniform(0.005, 3, 20000)
+sigma = rng.uniform(0.05, 1.5, 20000)
+option_type = np.where(rng.random(20000) < 0.5, "call", "put")
+vols, converged = implied_volatility_chain(bs_price(100, K, T, 0.04, sigma, 0.01, option_type), 100, K, T, 0.04, 0.01, option_type)
+assert np.all(np.isnan(vols[~converged]))
+assert np.allclose(vols[converged], sigma[converged], rtol=0, atol=1e-6), np.nanmax(np.abs(vols - sigma))
+print(f"chain: {converged.sum()} of {len(K)} converged, max error {np.max(np.abs(vols - sigma)[converged]):.2e}")
+
+# near-zero vega: the price matches to 1e-8 long before the vol does
+iv = implied_volatility(bs_price(100, 120, 0.02, 0.05, 0.136, 0.0, "call"), 100, 120, 0.02, 0.05, 0.0, "call")
+assert iv.converged and abs(iv.vol - 0.136) < 1e-6, iv
+print(f"K = 120, T = 0.02: {iv}")
+
+# deep in the money the price carries no vol information at all
+iv = implied_volatility(bs_price(100, 191.53, 0.0913, 0.04, 0.2575, 0.01, "put"), 100, 191.53, 0.0913, 0.04, 0.01, "put")
+assert not iv.converged and np.isnan(iv.vol), iv
+print(f"K = 191.53 put: {iv}")
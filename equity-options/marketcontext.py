@@ -0,0 +1,21 @@
+from collections import namedtuple
+
+from optionspricing import stock_data, div_yield
+from volsurface import vol_surface, vol_grid, if_calibrated
+
+# everything the legs of a strategy read from the market, fetched and calibrated once
+# per ticker and date so all legs are priced off the same snapshot
+MarketContext = namedtuple("MarketContext", ["ticker", "date", "S_0", "sigma", "q", "surface", "grid"])
+
+# historical contexts have no option chains, so no surface or vol grid and legs fall
+# back to historical vol
+def market_context(ticker, date=None):
+    S_0, sigma = stock_data(ticker, date)
+    q = div_yield(ticker)
+
+    surface = grid = None
+    if date is None:
+        surface = if_calibrated(vol_surface, ticker)
+        grid = None if surface is None else vol_grid(ticker)
+
+    return MarketContext(ticker, date, S_0, sigma, q, surface, grid)
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+OptionChain = namedtuple("OptionChain", ["calls", "puts"])
+
+# seconds each kind of data stays fresh
+TTL = {
+    "history": 6 * 3600,
+    "dividend_yield": 24 * 3600,
+    "expiries": 3600,
+    "option_chain": 15 * 60,
+    "vol_surface": 15 * 60,
+    "vol_grid": 15 * 60,
+}
+
+CACHE_DIR = os.environ.get("MARKETDATA_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "financial-engineering", "marketdata"))
+
+# two tiers: an in-process LRU in front of a pickle store on disk, both keyed by
+# (kind, ticker, as-of date, ...) and expired per kind
+class MarketDataCache:
+    def __init__(self, maxsize=256, directory=CACHE_DIR, ttl=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.ttl = dict(TTL, **(ttl or {}))
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._memory = OrderedDict()
+
+    def get(self, kind, key, fetch):
+        key = (kind,) + tuple(key)
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None and now - entry[0] < self.ttl[kind]:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry[1]
+
+        entry = self._load(key)
+        if entry is not None and now - entry[0] < self.ttl[kind]:
+            self.stats["disk_hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            entry = (now, fetch())
+            self._store(key, entry)
+
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+        return entry[1]
+
+    def clear(self, disk=False):
+        self._memory.clear()
+        if disk and self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".pkl")
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    # the disk tier is best effort: an unwritable directory only costs the cache
+    def _store(self, key, entry):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(entry, f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+cache = MarketDataCache()
+
+def cache_stats():
+    return dict(cache.stats)
+
+def _as_of(date):
+    return datetime.today().strftime('%Y-%m-%d') if date is None else pd.to_datetime(date).strftime('%Y-%m-%d')
+
+# live data from yfinance, through the cache
+class YFinanceProvider:
+    def now(self):
+        return datetime.now()
+
+    # daily bars ending at date (or today), one year of them unless start is given
+    def history(self, ticker, date=None, start=None):
+        def fetch():
+            stock = yf.Ticker(ticker)
+            if start is not None:
+                return stock.history(start=pd.to_datetime(start), end=None if date is None else pd.to_datetime(date))
+            if date is not None:
+                end = pd.to_datetime(date)
+                return stock.history(start=end - pd.Timedelta(days=365), end=end)
+            return stock.history(period="1y")
+
+        key = (ticker, _as_of(date)) if start is None else (ticker, _as_of(date), _as_of(start))
+        return cache.get("history", key, fetch)
+
+    def dividend_yield(self, ticker):
+        def fetch():
+            try:
+                value = yf.Ticker(ticker).info['dividendYield']
+                return value if value is not None else 0
+            except KeyError:
+                return 0
+
+        return cache.get("dividend_yield", (ticker, _as_of(None)), fetch)
+
+    def expiries(self, ticker):
+        return cache.get("expiries", (ticker, _as_of(None)), lambda: tuple(yf.Ticker(ticker).options))
+
+    def option_chain(self, ticker, expiry):
+        def fetch():
+            chain = yf.Ticker(ticker).option_chain(expiry)
+            return OptionChain(chain.calls, chain.puts)
+
+        return cache.get("option_chain", (ticker, _as_of(None), expiry), fetch)
+
+MarketSnapshot = namedtuple("MarketSnapshot", ["as_of", "history", "dividend_yields", "chains", "treasury_curve"])
+
+# replays a MarketSnapshot: no network, and "now" is the moment it was taken
+class SnapshotProvider:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def now(self):
+        return self.snapshot.as_of
+
+    def _lookup(self, table, ticker):
+        if ticker not in table:
+            raise ValueError(f"No data for {ticker} in the snapshot taken {self.snapshot.as_of:%Y-%m-%d %H:%M}")
+        return table[ticker]
+
+    def history(self, ticker, date=None, start=None):
+        hist = self._lookup(self.snapshot.history, ticker)
+        if date is None and start is None:
+            return hist
+        end = hist.index[-1] + pd.Timedelta(days=1) if date is None else pd.to_datetime(date)
+        begin = end - pd.Timedelta(days=365) if start is None else pd.to_datetime(start)
+        if hist.index.tz is not None:
+            end, begin = (x if x.tz is not None else x.tz_localize(hist.index.tz) for x in (end, begin))
+        return hist[(hist.index >= begin) & (hist.index < end)]
+
+    def dividend_yield(self, ticker):
+        return self._lookup(self.snapshot.dividend_yields, ticker)
+
+    def expiries(self, ticker):
+        return tuple(self._lookup(self.snapshot.chains, ticker))
+
+    def option_chain(self, ticker, expiry):
+        return self._lookup(self.snapshot.chains, ticker)[expiry]
+
+provider = YFinanceProvider()
+
+def set_provider(new_provider):
+    global provider
+    previous, provider = provider, new_provider
+    return previous
+
+def use_snapshot(path):
+    snapshot = load_snapshot(path)
+    set_provider(SnapshotProvider(snapshot))
+    return snapshot
+
+def history(ticker, date=None, start=None):
+    return provider.history(ticker, date, start)
+
+def dividend_yield(ticker):
+    return provider.dividend_yield(ticker)
+
+def expiries(ticker):
+    return provider.expiries(ticker)
+
+# expiry=None is the nearest listed expiry, as in yfinance
+def option_chain(ticker, expiry=None):
+    if expiry is None:
+        expiry = expiries(ticker)[0]
+    return provider.option_chain(ticker, expiry)
+
+# identifies the market state derived data (e.g. a calibrated surface) was built from:
+# the snapshot being replayed, or today's live data
+def as_of_key():
+    if isinstance(provider, SnapshotProvider):
+        return provider.snapshot.as_of.isoformat()
+    return _as_of(None)
+
+# years from now (the snapshot time when replaying) to an expiry date
+def time_to_expiry(expiry):
+    return (datetime.strptime(expiry, '%Y-%m-%d') - provider.now()).total_seconds() / (365 * 24 * 3600)
+
+def closest_expiry(ticker, T):
+    exp_dates = expiries(ticker)
+    if not exp_dates:
+        raise ValueError(f"No options data available for ticker {ticker}")
+    target_expiry = provider.now() + timedelta(days=T * 365)
+    return min(exp_dates, key=lambda x: abs(datetime.strptime(x, '%Y-%m-%d') - target_expiry))
+
+# snapshots: everything a pricing run reads, captured at one moment
+
+def capture_snapshot(tickers, treasury_curve=None):
+    snapshot = MarketSnapshot(datetime.now(), {}, {}, {}, dict(treasury_curve or {}))
+    for ticker in tickers:
+        snapshot.history[ticker] = history(ticker)
+        snapshot.dividend_yields[ticker] = dividend_yield(ticker)
+        snapshot.chains[ticker] = {expiry: option_chain(ticker, expiry) for expiry in expiries(ticker)}
+    return snapshot
+
+# columnar npz: one array per column, no pickled objects; datetimes are stored as
+# naive UTC datetime64 with their time zone in the metadata
+def _frame_columns(prefix, frame, arrays):
+    columns = []
+    for name, column in [(frame.index.name, frame.index.to_series())] + list(frame.items()):
+        tz = None
+        if isinstance(column.dtype, pd.DatetimeTZDtype):
+            tz = str(column.dt.tz)
+            column = column.dt.tz_convert("UTC").dt.tz_localize(None)
+        values = column.to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays[f"{prefix}/{len(columns)}"] = values
+        columns.append([name, tz])
+    return columns  # the first entry is the index
+
+def _frame(prefix, columns, arrays):
+    data = []
+    for i, (name, tz) in enumerate(columns):
+        values = pd.Series(arrays[f"{prefix}/{i}"], name=name)
+        if tz is not None:
+            values = values.dt.tz_localize("UTC").dt.tz_convert(tz)
+        data.append(values)
+    frame = pd.concat(data[1:], axis=1) if len(data) > 1 else pd.DataFrame(index=range(len(data[0])))
+    frame.index = pd.Index(data[0], name=columns[0][0])
+    return frame
+
+def save_snapshot(snapshot, path):
+    arrays = {}
+    meta = {"as_of": snapshot.as_of.isoformat(), "dividend_yields": snapshot.dividend_yields,
+            "treasury_curve": snapshot.treasury_curve, "history": {}, "chains": {}}
+
+    for i, (ticker, hist) in enumerate(snapshot.history.items()):
+        meta["history"][ticker] = [f"h{i}", _frame_columns(f"h{i}", hist, arrays)]
+    for i, (ticker, chains) in enumerate(snapshot.chains.items()):
+        meta["chains"][ticker] = {}
+        for j, (expiry, chain) in enumerate(chains.items()):
+            meta["chains"][ticker][expiry] = [f"c{i}.{j}",
+                                              _frame_columns(f"c{i}.{j}/calls", chain.calls, arrays),
+                                              _frame_columns(f"c{i}.{j}/puts", chain.puts, arrays)]
+
+    arrays["meta"] = np.array(json.dumps(meta))
+    np.savez_compressed(path, **arrays)
+
+def load_snapshot(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays["meta"]))
+        history_frames = {ticker: _frame(prefix, columns, arrays)
+                          for ticker, (prefix, columns) in meta["history"].items()}
+        chains = {ticker: {expiry: OptionChain(_frame(f"{prefix}/calls", calls, arrays),
+                                               _frame(f"{prefix}/puts", puts, arrays))
+                           for expiry, (prefix, calls, puts) in expiry_chains.items()}
+                  for ticker, expiry_chains in meta["chains"].items()}
+
+    return MarketSnapshot(datetime.fromisoformat(meta["as_of"]), history_frames,
+                          meta["dividend_yields"], chains, meta["treasury_curve"])
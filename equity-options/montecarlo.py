@@ -1,78 +1,250 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from collections import namedtuple
+from functools import partial
+from scipy.stats import norm, qmc, t as student_t
 
-def monte_carlo_european(S0, K, T, r, q, sigma, option_type='call', simulations=10000, n=252):
+import optionspricing
+from parallel import pool_map
+
+BATCH_ELEMENTS = 2 ** 21  # normals held in memory at once
+CHUNK_STEPS = 32  # time steps drawn at once when streaming a path-dependent statistic
+TASK_PATHS = 2 ** 16  # paths per independently seeded task
+CONFIDENCE = 0.95
+
+MonteCarloResult = namedtuple("MonteCarloResult", ["price", "std_error", "conf_int"])
+
+# batches are powers of two so sobol draws keep their balance properties
+def _batches(simulations, steps, antithetic=False):
+    batch_size = 2 ** int(np.log2(max(2, BATCH_ELEMENTS // steps)))
+    if antithetic:
+        simulations += simulations % 2  # paths come in mirrored pairs
+    for start in range(0, simulations, batch_size):
+        yield min(batch_size, simulations - start)
+
+class _PseudoRandom:
+    def __init__(self, rng, antithetic=False):
+        self.rng = rng
+        self.antithetic = antithetic
+
+    def normals(self, size, steps):
+        if self.antithetic:
+            Z = self.rng.standard_normal((size // 2, steps))
+            return np.concatenate([Z, -Z])
+        return self.rng.standard_normal((size, steps))
+
+    # brownian increments in units of sqrt(dt), drawn chunk by chunk
+    def increments(self, size, n):
+        for start in range(0, n, CHUNK_STEPS):
+            yield self.normals(size, min(CHUNK_STEPS, n - start))
+
+class _SobolBridge(_PseudoRandom):
+    def __init__(self, dimensions, rng, antithetic=False):
+        super().__init__(rng, antithetic)
+        self.engine = qmc.Sobol(dimensions, scramble=True, seed=rng)
+
+    def normals(self, size, steps):
+        Z = norm.ppf(self.engine.random(size // 2 if self.antithetic else size))
+        return np.concatenate([Z, -Z]) if self.antithetic else Z
+
+    # whole paths at once: the leading sobol dimensions fix the coarse shape of the path
+    def increments(self, size, n):
+        yield np.diff(_brownian_bridge(self.normals(size, n)), axis=1, prepend=0)
+
+# W at times 1..n (in units of dt): first the endpoint, then midpoints breadth-first
+def _brownian_bridge(Z):
+    size, n = Z.shape
+    Z = np.ascontiguousarray(Z.T)
+    W = np.zeros((n + 1, size))
+    W[n] = np.sqrt(n) * Z[0]
+
+    intervals = [(0, n)]
+    column = 1
+    for left, right in intervals:
+        if right - left < 2:
+            continue
+        mid = (left + right) // 2
+        W[mid] = (((right - mid) * W[left] + (mid - left) * W[right]) / (right - left)
+                  + np.sqrt((mid - left) * (right - mid) / (right - left)) * Z[column])
+        column += 1
+        intervals += [(left, mid), (mid, right)]
+
+    return W[1:].T
+
+# payoffs that only need S_T: draw it exactly in one step
+def _terminal_prices(S0, T, r, q, sigma, sampler, size):
+    Z = sampler.normals(size, 1)[:, 0]
+    return S0 * np.exp((r - q - 0.5 * sigma ** 2) * T + sigma * np.sqrt(T) * Z)
+
+# arithmetic and geometric averages over the n fixings dt, 2dt, ..., T, built from the
+# sampler's increments so only the current log price and the running sums are kept
+def _average_prices(S0, T, r, q, sigma, sampler, size, n):
     dt = T / n
-    S = np.zeros((simulations, n))
-    S[:, 0] = S0
+    drift = (r - q - 0.5 * sigma ** 2) * dt
+    vol = sigma * np.sqrt(dt)
 
-    for t in range(1, n):
-        Z = np.random.standard_normal(simulations)
-        S[:, t] = S[:, t - 1] * np.exp((r - q - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * Z)
+    log_S = np.full(size, np.log(S0))
+    running_sum = np.zeros(size)
+    running_log_sum = np.zeros(size)
+    for Z in sampler.increments(size, n):
+        log_path = log_S[:, None] + np.cumsum(drift + vol * Z, axis=1)
+        running_sum += np.exp(log_path).sum(axis=1)
+        running_log_sum += log_path.sum(axis=1)
+        log_S = log_path[:, -1]
 
-    if option_type == 'call':
-        payoffs = np.maximum(S[:, -1] - K, 0)
-    elif option_type == 'put':
-        payoffs = np.maximum(K - S[:, -1], 0)
+    return running_sum / n, np.exp(running_log_sum / n)
+
+def _result(price, std_error, quantile):
+    half_width = quantile * std_error
+    return MonteCarloResult(price, std_error, (price - half_width, price + half_width))
+
+# count, means and centred second moments of the discounted payoff y and control x
+def _moments(y, x):
+    y_c = y - np.mean(y)
+    x_c = x - np.mean(x)
+    return np.array([len(y), np.mean(y), np.mean(x), y_c @ y_c, x_c @ x_c, x_c @ y_c])
+
+# pairwise combination of two sets of moments (Chan et al.)
+def _merge(a, b):
+    if a is None:
+        return b
+    count = a[0] + b[0]
+    weight = a[0] * b[0] / count
+    d_y, d_x = b[1] - a[1], b[2] - a[2]
+    return np.array([count,
+                     a[1] + d_y * b[0] / count,
+                     a[2] + d_x * b[0] / count,
+                     a[3] + b[3] + d_y * d_y * weight,
+                     a[4] + b[4] + d_x * d_x * weight,
+                     a[5] + b[5] + d_x * d_y * weight])
+
+def _finish(moments, control_mean=None):
+    count, price, mean_x, m2_y, m2_x, c_xy = moments
+    variance = m2_y / count
+
+    if control_mean is not None:
+        beta = c_xy / m2_x if m2_x > 0 else 0.0
+        price -= beta * (mean_x - control_mean)
+        variance = (m2_y - beta * c_xy) / count
+
+    std_error = np.sqrt(max(variance, 0.0) / max(count - 1, 1))
+    return _result(price, std_error, norm.ppf(0.5 + CONFIDENCE / 2))
+
+# one independently seeded task: sample(sampler, size) returns discounted payoffs and a
+# control; moments are merged batch by batch so memory does not grow with simulations
+def _run_task(sample, method, antithetic, steps, simulations, seed):
+    rng = np.random.default_rng(seed)
+    sampler = _PseudoRandom(rng, antithetic) if method == "pseudo" else _SobolBridge(steps, rng, antithetic)
+
+    moments = None
+    for size in _batches(simulations, steps, antithetic):
+        y, x = sample(sampler, size)
+        if antithetic:  # average each path with its mirror so the samples are independent
+            y = 0.5 * (y[:size // 2] + y[size // 2:])
+            x = 0.5 * (x[:size // 2] + x[size // 2:])
+        moments = _merge(moments, _moments(y, x))
+    return moments
+
+# pseudo-random runs are split into fixed-size tasks and sobol runs into scrambled
+# replicates, each with a stream spawned from seed; results are combined in task order,
+# so a seed gives bit-identical prices for any number of workers
+def _simulate(sample, simulations, steps, antithetic, control_mean, method, replicates, seed, workers):
+    if method == "pseudo":
+        sizes = [min(TASK_PATHS, simulations - start) for start in range(0, simulations, TASK_PATHS)]
+    elif method == "sobol":
+        sizes = [2 ** int(np.ceil(np.log2(max(2, simulations / replicates))))] * replicates
     else:
-        raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+        raise ValueError("Invalid method. Must be 'pseudo' or 'sobol'.")
 
-    option_price = np.exp(-r * T) * np.mean(payoffs)
-    return option_price
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(sample, method, antithetic, steps, size, task_seed) for size, task_seed in zip(sizes, seeds)]
+    results = pool_map(_run_task, tasks, workers)
 
-def monte_carlo_digital(S0, K, T, r, q, sigma, option_type='call', simulations=10000, n=252):
-    dt = T / n
-    S = np.zeros((simulations, n))
-    S[:, 0] = S0
+    if method == "pseudo":
+        moments = None
+        for task_moments in results:
+            moments = _merge(moments, task_moments)
+        return _finish(moments, control_mean)
 
-    for t in range(1, n):
-        Z = np.random.standard_normal(simulations)
-        S[:, t] = S[:, t - 1] * np.exp((r - q - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * Z)
+    # the spread of the replicate estimates gives the sobol standard error
+    prices = [_finish(task_moments, control_mean).price for task_moments in results]
+    std_error = np.std(prices, ddof=1) / np.sqrt(replicates)
+    return _result(np.mean(prices), std_error, student_t.ppf(0.5 + CONFIDENCE / 2, replicates - 1))
 
+def _vanilla_payoff(K, option_type):
     if option_type == 'call':
-        payoffs = np.where(S[:, -1] > K, 1, 0)
+        return lambda S: np.maximum(S - K, 0)
     elif option_type == 'put':
-        payoffs = np.where(S[:, -1] < K, 1, 0)
+        return lambda S: np.maximum(K - S, 0)
     else:
         raise ValueError("Invalid option type. Must be 'call' or 'put'.")
 
-    option_price = np.exp(-r * T) * np.mean(payoffs)
-    return option_price
+def _digital_payoff(K, option_type):
+    if option_type == 'call':
+        return lambda S: np.where(S > K, 1, 0)
+    elif option_type == 'put':
+        return lambda S: np.where(S < K, 1, 0)
+    else:
+        raise ValueError("Invalid option type. Must be 'call' or 'put'.")
 
-def monte_carlo_range_accrual(S0, K_low, K_up, T, r, q, sigma, coupon, simulations=10000, n=252):
-    dt = T / n
-    S = np.zeros((simulations, n))
-    S[:, 0] = S0
+# samplers are module-level so tasks can be sent to worker processes
 
-    for t in range(1, n):
-        Z = np.random.standard_normal(simulations)
-        S[:, t] = S[:, t - 1] * np.exp((r - q - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * Z)
+def _european_sample(S0, K, T, r, q, sigma, option_type, sampler, size):
+    S_T = _terminal_prices(S0, T, r, q, sigma, sampler, size)
+    discount = np.exp(-r * T)
+    return discount * _vanilla_payoff(K, option_type)(S_T), discount * S_T
 
-    in_range = np.logical_and(S[:, -1] > K_low, S[:, -1] < K_up)
-    payoffs = in_range * coupon
-    option_price = np.exp(-r * T) * np.mean(payoffs)
-    return option_price
+def _digital_sample(S0, K, T, r, q, sigma, option_type, sampler, size):
+    S_T = _terminal_prices(S0, T, r, q, sigma, sampler, size)
+    discount = np.exp(-r * T)
+    return discount * _digital_payoff(K, option_type)(S_T), discount * _vanilla_payoff(K, option_type)(S_T)
 
-def monte_carlo_asian(S0, K, T, r, q, sigma, option_type='call', simulations=10000, n=252):
-    dt = T / n
-    S = np.zeros((simulations, n))
-    S[:, 0] = S0
+def _range_accrual_sample(S0, K_low, K_up, T, r, q, sigma, coupon, sampler, size):
+    S_T = _terminal_prices(S0, T, r, q, sigma, sampler, size)
+    discount = np.exp(-r * T)
+    return discount * np.logical_and(S_T > K_low, S_T < K_up) * coupon, discount * (S_T > K_low) * coupon
 
-    for t in range(1, n):
-        Z = np.random.standard_normal(simulations)
-        S[:, t] = S[:, t - 1] * np.exp((r - q - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * Z)
+def _asian_sample(S0, K, T, r, q, sigma, option_type, n, sampler, size):
+    arithmetic, geometric = _average_prices(S0, T, r, q, sigma, sampler, size, n)
+    payoff = _vanilla_payoff(K, option_type)
+    discount = np.exp(-r * T)
+    return discount * payoff(arithmetic), discount * payoff(geometric)
 
-    S_avg = np.mean(S, axis=1)
+# n is only used by path-dependent payoffs; european-style payoffs draw S_T directly.
+# control variate: the discounted terminal price, worth S0 * exp(-qT)
+def monte_carlo_european(S0, K, T, r, q, sigma, option_type='call', simulations=10000, n=252,
+                         antithetic=False, control_variate=False, method='pseudo', replicates=16,
+                         seed=None, workers=None):
+    _vanilla_payoff(K, option_type)
+    sample = partial(_european_sample, S0, K, T, r, q, sigma, option_type)
+    control_mean = S0 * np.exp(-q * T) if control_variate else None
+    return _simulate(sample, simulations, 1, antithetic, control_mean, method, replicates, seed, workers)
 
-    if option_type == 'call':
-        payoffs = np.maximum(S_avg - K, 0)
-    elif option_type == 'put':
-        payoffs = np.maximum(K - S_avg, 0)
-    else:
-        raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+# control variate: the vanilla with the same strike, priced with bs_price
+def monte_carlo_digital(S0, K, T, r, q, sigma, option_type='call', simulations=10000, n=252,
+                        antithetic=False, control_variate=False, method='pseudo', replicates=16,
+                        seed=None, workers=None):
+    _digital_payoff(K, option_type)
+    sample = partial(_digital_sample, S0, K, T, r, q, sigma, option_type)
+    control_mean = optionspricing.bs_price(S0, K, T, r, sigma, q, option_type) if control_variate else None
+    return _simulate(sample, simulations, 1, antithetic, control_mean, method, replicates, seed, workers)
+
+# control variate: a digital call at the lower barrier, priced in closed form
+def monte_carlo_range_accrual(S0, K_low, K_up, T, r, q, sigma, coupon, simulations=10000, n=252,
+                              antithetic=False, control_variate=False, method='pseudo', replicates=16,
+                              seed=None, workers=None):
+    sample = partial(_range_accrual_sample, S0, K_low, K_up, T, r, q, sigma, coupon)
+    control_mean = coupon * optionspricing.digital_bs_price(S0, K_low, T, r, sigma, q, "call") if control_variate else None
+    return _simulate(sample, simulations, 1, antithetic, control_mean, method, replicates, seed, workers)
 
-    option_price = np.exp(-r * T) * np.mean(payoffs)
-    return option_price
+# control variate: the geometric-average Asian with the same fixings, priced in closed form
+def monte_carlo_asian(S0, K, T, r, q, sigma, option_type='call', simulations=10000, n=252,
+                      antithetic=False, control_variate=False, method='pseudo', replicates=16,
+                      seed=None, workers=None):
+    _vanilla_payoff(K, option_type)
+    sample = partial(_asian_sample, S0, K, T, r, q, sigma, option_type, n)
+    control_mean = optionspricing.geometric_asian_price(S0, K, T, r, sigma, q, n, option_type) if control_variate else None
+    return _simulate(sample, simulations, n, antithetic, control_mean, method, replicates, seed, workers)
 
 def plot_price_paths(S0, K, T, r, sigma, simulations=10, n=252):
     dt = T / n
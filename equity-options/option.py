@@ -1,19 +1,30 @@
-from scipy.stats import norm
 import numpy as np
-import yfinance as yf
 from tabulate import tabulate
 from optionspricing import (stock_data,
                             div_yield,
                             bs_price,
+                            bs_greeks,
                             binom_price,
+                            american_price,
+                            print_convergence,
                             actual_option_price,
                             implied_volatility,
                             print_option_price)
-from svi import SVIModel
+from volsurface import vol_surface, vol_grid, if_calibrated
 from montecarlo import monte_carlo_european
 
+# changing any of these makes the cached price and greeks stale
+PRICING_INPUTS = ("S_0", "sigma", "q", "r", "T", "K", "option_type")
+
 class Option:
-    def __init__(self, ticker, r, T, K, n, option_type="call", position="long", creation_date=None):
+    # S_0, sigma and q may be injected or taken from a shared MarketContext; otherwise
+    # they are fetched on first use. With lazy=True nothing is fetched or priced until asked for.
+    # A sigma that is not injected is read off the ticker's implied-vol grid at (K, T), so it
+    # follows the strike and expiry; historical vol is the fallback when there is no grid.
+    # method picks the American pricer: "binomial" (the n-step tree), "baw" or "bjerksund_stensland",
+    # and tree the lattice flavour: "crr", "leisen_reimer", "bbs" or "bbsr".
+    def __init__(self, ticker, r, T, K, n, option_type="call", position="long", creation_date=None,
+                 S_0=None, sigma=None, q=None, lazy=False, context=None, method="binomial", tree="crr"):
 
         self.ticker = ticker
         self.r = r
@@ -22,32 +33,148 @@ class Option:
         self.n = n
         self.option_type = option_type
         self.position = position
+        self.method = method
+        self.tree = tree
 
         self.creation_date = creation_date
-        self.S_0, self.sigma = stock_data(ticker, creation_date)
-        """
-        strikes, market_vols = self._fetch_market_vol_data()
-        if strikes and market_vols:
-            svi_model = SVIModel()
-            svi_model.fit(strikes, market_vols, self.S_0)
-            self.sigma = svi_model.svi_volatility(np.log(self.K / self.S_0))
-        else:
-            self.sigma = _ , = stock_data(ticker, creation_date)
-        """
-        self.q = div_yield(ticker)
-        self.price = bs_price(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.option_type)
+        self.context = context
+        if context is not None:
+            S_0 = S_0 if S_0 is not None else context.S_0
+            q = q if q is not None else context.q
+        self._S_0 = S_0
+        self._sigma = sigma
+        self._sigma_fixed = sigma is not None
+        self._q = q
+        self._price = None
+        self._greeks_cache = None
+        if not lazy:
+            self.price
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in PRICING_INPUTS:
+            self._price = None
+            self._greeks_cache = None
+            if name in ("K", "T") and not self.__dict__.get("_sigma_fixed", True):
+                self._sigma = None  # read again off the grid
+
+    # market inputs
+
+    @property
+    def S_0(self):
+        if self._S_0 is None:
+            self._fetch_stock_data()
+        return self._S_0
+
+    @S_0.setter
+    def S_0(self, value):
+        self.set_market_data(S_0=value)
+
+    @property
+    def sigma(self):
+        if self._sigma is None:
+            self._sigma = self._market_vol()
+        return self._sigma
+
+    @sigma.setter
+    def sigma(self, value):
+        self.set_market_data(sigma=value)
+
+    @property
+    def q(self):
+        if self._q is None:
+            self._q = div_yield(self.ticker)
+        return self._q
+
+    @q.setter
+    def q(self, value):
+        self.set_market_data(q=value)
+
+    # returns the historical vol
+    def _fetch_stock_data(self):
+        S_0, sigma = stock_data(self.ticker, self.creation_date)
+        if self._S_0 is None:
+            self._S_0 = S_0
+        return sigma
+
+    def _market_vol(self):
+        grid = self.vol_grid
+        if grid is not None:
+            return float(grid.sigma(self.K, self.T))
+        if self.context is not None:
+            return self.context.sigma
+        return self._fetch_stock_data()
+
+    def set_market_data(self, S_0=None, sigma=None, q=None):
+        if S_0 is not None:
+            self._S_0 = S_0
+        if sigma is not None:
+            self._sigma = sigma
+            self._sigma_fixed = True
+        if q is not None:
+            self._q = q
+        self._price = None
+        self._greeks_cache = None
+
+    @property
+    def price(self):
+        if self._price is None:
+            self._price = bs_price(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.option_type)
+        return self._price
 
     @property
     def binom_european(self):
-        return binom_price(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.n, self.option_type, american=False)
+        return binom_price(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.n, self.option_type, american=False,
+                           tree=self.tree)
 
     @property
     def binom_american(self):
-        return binom_price(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.n, self.option_type, american=True)
+        return binom_price(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.n, self.option_type, american=True,
+                           tree=self.tree)
+
+    @property
+    def american_price(self):
+        return american_price(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.option_type, self.method, self.n,
+                              self.tree)
+
+    # error of every binomial flavour against the number of steps, to choose n
+    def convergence(self, american=True, **kwargs):
+        return print_convergence(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.option_type, american, **kwargs)
 
     @property
     def monte_carlo_price(self):
-        return monte_carlo_european(self.S_0, self.K, self.T, self.r, self.q, self.sigma, self.option_type)
+        return monte_carlo_european(self.S_0, self.K, self.T, self.r, self.q, self.sigma, self.option_type,
+                                    antithetic=True, control_variate=True).price
+
+    # the calibrated SVI surface of the ticker, shared through the context when there is one
+    @property
+    def surface(self):
+        if self.context is not None:
+            return self.context.surface
+        if self.creation_date is not None:
+            return None  # historical options data unavailable
+        return if_calibrated(vol_surface, self.ticker)
+
+    @property
+    def vol_grid(self):
+        if self.context is not None:
+            return self.context.grid
+        if self.creation_date is not None:
+            return None  # historical options data unavailable
+        return if_calibrated(vol_grid, self.ticker)
+
+    @property
+    def surface_vol(self):
+        surface = self.surface
+        return None if surface is None else float(surface.sigma(self.K, self.T))
+
+    # reprice with the surface vol itself at this strike and expiry rather than the grid interpolation
+    def use_surface(self):
+        sigma = self.surface_vol
+        if sigma is None:
+            raise ValueError(f"No volatility surface available for {self.ticker}")
+        self.sigma = sigma
+        return self
 
     @property
     def market(self):
@@ -57,104 +184,129 @@ class Option:
         else:
             return np.nan  # historical options data unavailable
 
+    # an ImpliedVol (vol, converged) for a quoted option; the vol is NaN when it did not converge
     @property
     def implied_volatility(self):
-        actual_price, _ = self.actual
         if self.creation_date is not None:
             return np.nan  # historical options data unavailable
+        actual_price = self.market
         if actual_price:
             return implied_volatility(actual_price, self.S_0, self.K, self.T, self.r, self.q, self.option_type)
         else:
             return "N/A"
 
-    # greeks calculation (delta, gamma, theta, vega, rho)
+    # greeks calculation: one record with delta, gamma, theta, vega, rho and the
+    # second-order vanna, volga and charm, computed together and cached until an input changes
+
+    @property
+    def greeks(self):
+        return dict(self._greeks())
 
     @property
     def delta(self):
-        d1, _ = self._d1_d2()
-        if self.option_type == "call":
-            return np.exp(-self.q * self.T) * norm.cdf(d1)
-        else:
-            return -np.exp(-self.q * self.T) * norm.cdf(-d1)
+        return self._greeks()["delta"]
 
     @property
     def gamma(self):
-        d1, _ = self._d1_d2()
-        return (np.exp(-self.q * self.T) * norm.pdf(d1)) / (self.S_0 * self.sigma * np.sqrt(self.T))
+        return self._greeks()["gamma"]
 
     @property
     def theta(self):
-        d1, d2 = self._d1_d2()
-        if self.option_type == "call":
-            theta = (- (self.S_0 * self.sigma * np.exp(-self.q * self.T) * norm.pdf(d1)) / (2 * np.sqrt(self.T))
-                     - self.q * self.S_0 * np.exp(-self.q * self.T) * norm.cdf(d1)
-                     + self.r * self.K * np.exp(-self.r * self.T) * norm.cdf(d2))
-        else:
-            theta = (- (self.S_0 * self.sigma * np.exp(-self.q * self.T) * norm.pdf(d1)) / (2 * np.sqrt(self.T))
-                     + self.q * self.S_0 * np.exp(-self.q * self.T) * norm.cdf(-d1)
-                     - self.r * self.K * np.exp(-self.r * self.T) * norm.cdf(-d2))
-        return theta / 365  # convert to per day
+        return self._greeks()["theta"]
 
     @property
     def vega(self):
-        d1, _ = self._d1_d2()
-        return (self.S_0 * np.exp(-self.q * self.T) * norm.pdf(d1) * np.sqrt(self.T)) / 100  # convert to percentage
+        return self._greeks()["vega"]
 
     @property
     def rho(self):
-        _, d2 = self._d1_d2()
-        if self.option_type == "call":
-            return (self.K * self.T * np.exp(-self.r * self.T) * norm.cdf(d2)) / 100  # convert to percentage
-        else:
-            return (-self.K * self.T * np.exp(-self.r * self.T) * norm.cdf(-d2)) / 100  # convert to percentage
+        return self._greeks()["rho"]
+
+    @property
+    def vanna(self):
+        return self._greeks()["vanna"]
 
-    # get black-scholes parameters
-    def _d1_d2(self):
-        d1 = (np.log(self.S_0 / self.K) + (self.r - self.q + 0.5 * self.sigma ** 2) * self.T) / (self.sigma * np.sqrt(self.T))
-        d2 = d1 - self.sigma * np.sqrt(self.T)
-        return d1, d2
+    @property
+    def volga(self):
+        return self._greeks()["volga"]
+
+    @property
+    def charm(self):
+        return self._greeks()["charm"]
+
+    def _greeks(self):
+        if self._greeks_cache is None:
+            self._greeks_cache = bs_greeks(self.S_0, self.K, self.T, self.r, self.sigma, self.q, self.option_type)
+        return self._greeks_cache
 
     # print summary
     def summary(self):
-        print_option_price(self.ticker, self.r, self.T, self.K, self.n, self.option_type)
+        print_option_price(self.ticker, self.r, self.T, self.K, self.n, self.option_type, self.creation_date,
+                           self.S_0, self.sigma, self.q)
         print("\n********** GREEKS **********\n")
+        greeks = self._greeks()
         greeks_table = [
-            ["Delta", f"{self.delta:.4f}"],
-            ["Gamma", f"{self.gamma:.4f}"],
-            ["Theta", f"{self.theta:.4f}"],
-            ["Vega", f"{self.vega:.4f}"],
-            ["Rho", f"{self.rho:.4f}"]
+            ["Delta", f"{greeks['delta']:.4f}"],
+            ["Gamma", f"{greeks['gamma']:.4f}"],
+            ["Theta", f"{greeks['theta']:.4f}"],
+            ["Vega", f"{greeks['vega']:.4f}"],
+            ["Rho", f"{greeks['rho']:.4f}"],
+            ["Vanna", f"{greeks['vanna']:.4f}"],
+            ["Volga", f"{greeks['volga']:.4f}"],
+            ["Charm", f"{greeks['charm']:.4f}"]
         ]
         print(tabulate(greeks_table, headers=["Greek", "Value"], tablefmt="grid"))
 
-        strikes, market_vols = self._fetch_market_vol_data()
-        svi_sigma = None
-        if strikes and market_vols:
-            svi_model = SVIModel()
-            svi_model.fit(strikes, market_vols, self.S_0)
-            svi_sigma = svi_model.svi_volatility(np.log(self.K / self.S_0))
+        svi_sigma = self.surface_vol
 
         print("\n********** SVI CALIBRATION **********\n")
         if svi_sigma is not None:
             svi_table = [
                 ["Strike (K)", f"{self.K}"],
                 ["Spot Price (S_0)", f"{self.S_0}"],
-                ["Implied Volatility (from SVI)", f"{svi_sigma * 100:.2f}%"]
+                ["Implied Volatility (from SVI surface)", f"{svi_sigma * 100:.2f}%"]
             ]
             print(tabulate(svi_table, headers=["Parameter", "Value"], tablefmt="grid"))
         else:
             print("SVI calibration data is not available for this option.")
-    
-    def _fetch_market_vol_data(self):
 
-        stock = yf.Ticker(self.ticker)
-        options = stock.option_chain()
+def create_option(ticker, r, T, K, n, option_type="call", position="long", creation_date=None,
+                  S_0=None, sigma=None, q=None, lazy=False, context=None, method="binomial", tree="crr"):
+    return Option(ticker, r, T, K, n, option_type, position, creation_date, S_0, sigma, q, lazy, context, method, tree)
+
+# fill in market inputs for many options with one fetch per ticker and date and one
+# vectorized vol-grid lookup; values already injected into an option are kept
+def load_market_data(options):
+    groups = {}
+    for option in options:
+        groups.setdefault((option.ticker, option.creation_date), []).append(option)
 
-        strikes = options.calls['strike'].values
-        market_vols = options.calls['impliedVolatility'].values
+    for (ticker, creation_date), group in groups.items():
+        S_0, sigma = stock_data(ticker, creation_date)
+        q = div_yield(ticker)
+        missing = [option for option in group if option._sigma is None]
+        vols = [sigma] * len(missing)
+        grid = if_calibrated(vol_grid, ticker) if creation_date is None else None
+        if grid is not None and missing:
+            vols = grid.sigma([option.K for option in missing], [option.T for option in missing])
 
-        valid_indices = ~np.isnan(market_vols)
-        return strikes[valid_indices].tolist(), market_vols[valid_indices].tolist()
+        for option in group:
+            option.set_market_data(S_0=option._S_0 if option._S_0 is not None else S_0,
+                                   q=option._q if option._q is not None else q)
+        for option, vol in zip(missing, np.atleast_1d(vols)):
+            option._sigma = float(vol)
 
-def create_option(ticker, r, T, K, n, option_type="call", position="long", creation_date=None):
-    return Option(ticker, r, T, K, n, option_type, position, creation_date)
+# American values of many options from one vectorized call (one tree per option for
+# "binomial"); method defaults to each option's own
+def american_prices(options, method=None):
+    load_market_data([option for option in options if option._S_0 is None or option._sigma is None or option._q is None])
+    prices = np.empty(len(options))
+    methods = [method or option.method for option in options]
+    for name in set(methods):
+        rows = [i for i, m in enumerate(methods) if m == name]
+        if name == "binomial":
+            prices[rows] = [options[i].binom_american for i in rows]
+            continue
+        inputs = [[getattr(options[i], field) for i in rows] for field in ("S_0", "K", "T", "r", "sigma", "q", "option_type")]
+        prices[rows] = american_price(*inputs, method=name)
+    return prices
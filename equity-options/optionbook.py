@@ -0,0 +1,129 @@
+import numpy as np
+from tabulate import tabulate
+
+from optionspricing import bs_greeks, stock_data, div_yield
+
+CALL, PUT, STOCK = 1, -1, 0
+OPTION_TYPES = {"call": CALL, "put": PUT, "stock": STOCK}
+POSITIONS = {"long": 1, "short": -1}
+
+GREEKS = ["delta", "gamma", "theta", "vega", "rho", "vanna", "volga", "charm"]
+
+# value and greeks of one unit of each position; inputs broadcast together. A stock
+# leg is worth S and carries a delta of one share, and an expired option is worth
+# its intrinsic value
+def position_greeks(option_type, S, K, T, r, sigma, q):
+    option_type, S, K, T, r, sigma, q = np.broadcast_arrays(option_type, S, K, T, r, sigma, q)
+    stock = option_type == STOCK
+    expired = ~stock & (T <= 0)
+    sign = np.where(option_type == CALL, 1.0, -1.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = bs_greeks(S, K, np.where(expired, 1.0, T), r, sigma, q, np.where(sign > 0, "call", "put"))
+    intrinsic = np.maximum(sign * (S - K), 0)
+    result = {name: np.where(stock | expired, 0.0, result[name]) for name in ["price"] + GREEKS}
+    result["price"] = np.where(stock, S, np.where(expired, intrinsic, result["price"]))
+    result["delta"] = np.where(stock, 1.0, np.where(expired, sign * (intrinsic > 0), result["delta"]))
+    return result
+
+# a position book stored as one NumPy column per field instead of a list of Option
+# objects, so pricing and aggregation are a handful of array operations however
+# many positions it holds. Market inputs (S_0, sigma, q) live per underlying and
+# are gathered onto positions through ticker_id; a position's own vol (e.g. off the
+# smile) overrides the underlying's sigma where it is not NaN.
+class OptionBook:
+    def __init__(self, tickers, ticker_id, option_type, strike, expiry, quantity, sign, rate, vol=np.nan):
+        self.tickers = list(tickers)
+        self.ticker_id = np.asarray(ticker_id, dtype=np.int32)
+        self.option_type = np.asarray(option_type, dtype=np.int8)
+        self.strike = np.asarray(strike, dtype=float)
+        self.expiry = np.asarray(expiry, dtype=float)  # years
+        self.quantity = np.asarray(quantity, dtype=float)
+        self.sign = np.asarray(sign, dtype=np.int8)
+        self.rate = np.broadcast_to(np.asarray(rate, dtype=float), self.strike.shape)
+        self.vol = np.array(np.broadcast_to(np.asarray(vol, dtype=float), self.strike.shape))
+
+        self.S_0 = np.full(len(self.tickers), np.nan)
+        self.sigma = np.full(len(self.tickers), np.nan)
+        self.q = np.full(len(self.tickers), np.nan)
+
+    def __len__(self):
+        return len(self.strike)
+
+    # one row per leg; an underlying shared by several strategies is priced off the
+    # MarketContext of the first strategy that holds it
+    @classmethod
+    def from_strategies(cls, strategies, quantities=None):
+        if quantities is None:
+            quantities = [1] * len(strategies)
+
+        tickers, columns = [], {"ticker_id": [], "option_type": [], "strike": [], "expiry": [],
+                                "quantity": [], "sign": [], "rate": [], "vol": []}
+        contexts = {}
+        for strategy, quantity in zip(strategies, quantities):
+            if strategy.ticker not in contexts:
+                contexts[strategy.ticker] = strategy.context
+                tickers.append(strategy.ticker)
+            ticker_id = tickers.index(strategy.ticker)
+            for option in strategy.options:
+                columns["ticker_id"].append(ticker_id)
+                columns["option_type"].append(OPTION_TYPES[option.option_type])
+                columns["strike"].append(option.K)
+                columns["expiry"].append(option.T)
+                columns["quantity"].append(quantity)
+                columns["sign"].append(POSITIONS[option.position])
+                columns["rate"].append(option.r)
+                columns["vol"].append(option.sigma if option.option_type != "stock" else np.nan)
+
+        book = cls(tickers, **columns)
+        for ticker, context in contexts.items():
+            book.set_market_data(ticker, context.S_0, context.sigma, context.q)
+        return book
+
+    def set_market_data(self, ticker, S_0=None, sigma=None, q=None):
+        i = self.tickers.index(ticker)
+        if S_0 is not None:
+            self.S_0[i] = S_0
+        if sigma is not None:
+            self.sigma[i] = sigma
+        if q is not None:
+            self.q[i] = q
+
+    # fetch whatever is still missing, once per underlying
+    def load_market_data(self, date=None):
+        for i, ticker in enumerate(self.tickers):
+            if np.isnan(self.S_0[i]) or np.isnan(self.sigma[i]):
+                S_0, sigma = stock_data(ticker, date)
+                self.S_0[i] = S_0 if np.isnan(self.S_0[i]) else self.S_0[i]
+                self.sigma[i] = sigma if np.isnan(self.sigma[i]) else self.sigma[i]
+            if np.isnan(self.q[i]):
+                self.q[i] = div_yield(ticker)
+
+    def position_vol(self):
+        return np.where(np.isnan(self.vol), self.sigma[self.ticker_id], self.vol)
+
+    # per-position value and greeks, signed and scaled by quantity
+    def positions(self):
+        ids = self.ticker_id
+        result = position_greeks(self.option_type, self.S_0[ids], self.strike, self.expiry, self.rate,
+                                 self.position_vol(), self.q[ids])
+        weight = self.sign * self.quantity
+        return {name: values * weight for name, values in result.items()}
+
+    def totals(self):
+        return {name: values.sum() for name, values in self.positions().items()}
+
+    def by_underlying(self):
+        sums = {name: np.bincount(self.ticker_id, weights=values, minlength=len(self.tickers))
+                for name, values in self.positions().items()}
+        return {ticker: {name: values[i] for name, values in sums.items()} for i, ticker in enumerate(self.tickers)}
+
+    def summary(self):
+        grouped = self.by_underlying()
+        totals = self.totals()
+        columns = ["price"] + GREEKS
+        rows = [[ticker] + [f"{grouped[ticker][name]:.4f}" for name in columns] for ticker in self.tickers]
+        rows.append(["Total"] + [f"{totals[name]:.4f}" for name in columns])
+
+        print(f"\n********** BOOK ({len(self)} positions) **********\n")
+        print(tabulate(rows, headers=["Underlying"] + [name.capitalize() for name in columns], tablefmt="grid"))
@@ -1,87 +1,336 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import math
+from collections import namedtuple
 
 from scipy.stats import norm
-from scipy.optimize import brentq
 
 from datetime import datetime, timedelta
 from tabulate import tabulate
 
-from montecarlo import monte_carlo_european
+import montecarlo
+import marketdata
+from realizedvol import realized_volatility
 
 def stock_data(ticker, date=None):
-    stock = yf.Ticker(ticker)
+    estimator = realized_volatility(ticker, date)
 
-    if date is not None:
-        date = pd.to_datetime(date)
-        start_date = date - pd.Timedelta(days=365)
-        hist = stock.history(start=start_date, end=date)
-    else:
-        hist = stock.history(period="1y")
-
-    if hist.empty:
+    if not len(estimator):
+        date = pd.to_datetime(date if date is not None else datetime.today())
         raise ValueError(f"No data available for {ticker} on {date.strftime('%Y-%m-%d')}.")
-    current_price = hist['Close'].iloc[-1]
+    current_price = estimator.close[len(estimator) - 1]
 
-    log_returns = np.log(hist['Close'] / hist['Close'].shift(1))
-    volatility = np.std(log_returns) * np.sqrt(252)  # annualized volatility
+    # annualized close-to-close volatility over the year up to date (or the latest bar);
+    # the series may hold more. The first bar of that year anchors the returns
+    end = np.datetime64(pd.to_datetime(date), "ns") if date is not None else estimator.dates[len(estimator) - 1]
+    first = np.searchsorted(estimator.dates[:len(estimator)], end - np.timedelta64(365, "D"))
+    volatility = estimator.close_to_close(len(estimator) - 1 - int(first), ddof=0)
 
     return current_price, volatility
 
 def div_yield(ticker):
-    stock = yf.Ticker(ticker)
-    try:
-        dividend_yield = stock.info['dividendYield']
-        return dividend_yield if dividend_yield is not None else 0
-    except KeyError:
-        return 0
-
-def binom_price(S0, K, T, r, sigma, q, n, option_type="call", american=False):
-    dt = T / n
-    u = np.exp(sigma * np.sqrt(dt))
-    d = 1 / u
-    p = (np.exp((r - q) * dt) - d) / (u - d)
+    return marketdata.dividend_yield(ticker)
 
-    ST = np.zeros(n + 1)
-    for i in range(n + 1):
-        ST[i] = S0 * (u ** (n - i)) * (d ** i)
+# lattice flavours: "crr" (Cox-Ross-Rubinstein), "leisen_reimer" (odd n, with the
+# up-probabilities matched to d1 and d2 by Peizer-Pratt inversion), "bbs" (CRR with
+# the last step replaced by Black-Scholes) and "bbsr" (BBS Richardson-extrapolated
+# from n and n // 2 steps). BBS removes CRR's oscillation but still converges as 1 / n;
+# Leisen-Reimer converges as 1 / n^2 for European exercise (about 1 / n for American)
+# and BBSR cancels the leading 1 / n error of BBS
+TREES = ("crr", "leisen_reimer", "bbs", "bbsr")
 
-    if option_type == "call":
-        option_values = np.maximum(0, ST - K)
+# the number of steps a tree of this flavour actually takes for n
+def tree_steps(n, tree="crr"):
+    return n + 1 - n % 2 if tree == "leisen_reimer" else n
+
+def binom_price(S0, K, T, r, sigma, q, n, option_type="call", american=False, tree="crr"):
+    if tree not in TREES:
+        raise ValueError(f"Unknown tree {tree!r}, expected one of {', '.join(TREES)}")
+    if tree == "bbsr":
+        half = max(n // 2, 1)
+        fine = binom_price(S0, K, T, r, sigma, q, n, option_type, american, "bbs")
+        coarse = binom_price(S0, K, T, r, sigma, q, half, option_type, american, "bbs")
+        return (n * fine - half * coarse) / (n - half) if n > half else fine
+
+    # S0, K and option_type may be arrays: every contract of an expiry is rolled
+    # back together, one lattice level per step
+    S0, K, is_call = np.broadcast_arrays(np.asarray(S0, dtype=float), np.asarray(K, dtype=float),
+                                         np.asarray(option_type) == "call")
+    shape = K.shape
+    S0 = S0.reshape(-1, 1)
+    K = K.reshape(-1, 1)
+    sign = np.where(is_call, 1.0, -1.0).reshape(-1, 1)
+
+    n = tree_steps(n, tree)
+    dt = T / n
+    growth = np.exp((r - q) * dt)
+    if tree == "leisen_reimer":
+        d1 = (np.log(S0 / K) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
+        p = _peizer_pratt(d1 - sigma * np.sqrt(T), n)
+        u = growth * _peizer_pratt(d1, n) / p
+        d = (growth - p * u) / (1 - p)
+    else:
+        u = np.exp(sigma * np.sqrt(dt))
+        d = 1 / u
+        p = (growth - d) / (u - d)
+    p_up = np.exp(-r * dt) * p
+    p_down = np.exp(-r * dt) * (1 - p)
+
+    steps = n - 1 if tree == "bbs" else n
+    levels = np.arange(steps + 1)
+    ST = S0 * u ** (steps - levels) * d ** levels  # S0 * u^(steps-i) * d^i
+    if tree == "bbs":
+        # one step from expiry every node is worth its Black-Scholes value
+        option_values = bs_price(ST, K, dt, r, sigma, q, np.where(sign > 0, "call", "put"))
+        if american:
+            option_values = np.maximum(option_values, sign * (ST - K))
     else:
-        option_values = np.maximum(0, K - ST)
+        option_values = np.maximum(sign * (ST - K), 0)
+
+    for _ in range(steps):
+        option_values = p_up * option_values[:, :-1] + p_down * option_values[:, 1:]
+        if american:
+            ST = ST[:, :-1] / u
+            np.maximum(option_values, sign * (ST - K), out=option_values)
+
+    prices = option_values[:, 0].reshape(shape)
+    return prices[()] if prices.ndim == 0 else prices
+
+# Peizer-Pratt method 2: the binomial probability whose n-step tail matches N(z)
+def _peizer_pratt(z, n):
+    return 0.5 + np.sign(z) * 0.5 * np.sqrt(-np.expm1(-(z / (n + 1 / 3 + 0.1 / (n + 1))) ** 2 * (n + 1 / 6)))
 
-    for j in range(n - 1, -1, -1):
-        for i in range(j + 1):
-            option_values[i] = np.exp(-r * dt) * (p * option_values[i] + (1 - p) * option_values[i + 1])
-            if american:
-                ST = S0 * (u ** (j - i)) * (d ** i)
-                if option_type == "call":
-                    option_values[i] = np.maximum(option_values[i], ST - K)
-                else:
-                    option_values[i] = np.maximum(option_values[i], K - ST)
+# absolute pricing error of every tree against the requested n (Leisen-Reimer runs
+# at the next odd n). The reference is Black-Scholes for European exercise and a
+# BBSR tree of reference_n steps for American
+def binomial_convergence(S0, K, T, r, sigma, q, option_type="call", american=False,
+                         steps=(25, 50, 100, 200, 400, 800, 1600), trees=TREES, reference_n=5000):
+    if american:
+        reference = binom_price(S0, K, T, r, sigma, q, reference_n, option_type, True, "bbsr")
+    else:
+        reference = bs_price(S0, K, T, r, sigma, q, option_type)
+    errors = {tree: [abs(binom_price(S0, K, T, r, sigma, q, n, option_type, american, tree) - reference)
+                     for n in steps] for tree in trees}
+    return pd.DataFrame(errors, index=pd.Index(steps, name="n")), reference
 
-    return option_values[0]
+def print_convergence(S0, K, T, r, sigma, q, option_type="call", american=False, **kwargs):
+    errors, reference = binomial_convergence(S0, K, T, r, sigma, q, option_type, american, **kwargs)
+    exercise = "American" if american else "European"
+    print(f"\n********** {exercise.upper()} {option_type.upper()} CONVERGENCE (reference ${reference:.6f}) **********\n")
+    # trees that round n show the steps they actually took
+    rows = [[n] + [f"{error:.2e}" + (f" (n={tree_steps(n, tree)})" if tree_steps(n, tree) != n else "")
+                   for tree, error in errors.loc[n].items()] for n in errors.index]
+    print(tabulate(rows, headers=["n"] + list(errors.columns), tablefmt="grid"))
+    return errors
 
 def bs_price(S, K, T, r, sigma, q, option_type="call"):
+    sign = np.where(np.asarray(option_type) == "call", 1.0, -1.0)
     d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
     d2 = d1 - sigma * np.sqrt(T)
-    if option_type == "call":
-        price = S * np.exp(-q * T) * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-    else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * np.exp(-q * T) * norm.cdf(-d1)
-    return price
+    price = sign * (S * np.exp(-q * T) * norm.cdf(sign * d1) - K * np.exp(-r * T) * norm.cdf(sign * d2))
+    return price[()]
+
+def digital_bs_price(S, K, T, r, sigma, q, option_type="call"):
+    sign = np.where(np.asarray(option_type) == "call", 1.0, -1.0)
+    d2 = (np.log(S / K) + (r - q - 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
+    return (np.exp(-r * T) * norm.cdf(sign * d2))[()]
+
+# geometric average over the n fixings dt, 2dt, ..., T is lognormal
+def geometric_asian_price(S, K, T, r, sigma, q, n, option_type="call"):
+    sign = np.where(np.asarray(option_type) == "call", 1.0, -1.0)
+    mean = np.log(S) + (r - q - 0.5 * sigma ** 2) * T * (n + 1) / (2 * n)
+    std = sigma * np.sqrt(T * (n + 1) * (2 * n + 1) / (6 * n ** 2))
+    d1 = (mean - np.log(K) + std ** 2) / std
+    d2 = d1 - std
+    price = sign * np.exp(-r * T) * (np.exp(mean + 0.5 * std ** 2) * norm.cdf(sign * d1) - K * norm.cdf(sign * d2))
+    return price[()]
+
+# price and greeks for a whole book of contracts from one evaluation of d1, d2,
+# the discount factors and the normal cdf/pdf; any argument may be an array
+def bs_greeks(S, K, T, r, sigma, q, option_type="call"):
+    S, K, T, r, sigma, q = (np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q))
+    sign = np.where(np.asarray(option_type) == "call", 1.0, -1.0)
+
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+
+    S_disc = S * np.exp(-q * T)
+    K_disc = K * np.exp(-r * T)
+    cdf_d1 = norm.cdf(sign * d1)
+    cdf_d2 = norm.cdf(sign * d2)
+    pdf_d1 = norm.pdf(d1)
+
+    greeks = {
+        "price": sign * (S_disc * cdf_d1 - K_disc * cdf_d2),
+        "delta": sign * np.exp(-q * T) * cdf_d1,
+        "gamma": S_disc * pdf_d1 / (S ** 2 * sigma * sqrt_T),
+        "theta": (- S_disc * pdf_d1 * sigma / (2 * sqrt_T)
+                  + sign * (q * S_disc * cdf_d1 - r * K_disc * cdf_d2)) / 365,  # per day
+        "vega": S_disc * pdf_d1 * sqrt_T / 100,  # per 1% vol
+        "rho": sign * K_disc * T * cdf_d2 / 100,  # per 1% rate
+        "vanna": -np.exp(-q * T) * pdf_d1 * d2 / sigma / 100,  # delta per 1% vol
+        "volga": S_disc * pdf_d1 * sqrt_T * d1 * d2 / sigma / 100 ** 2,  # vega per 1% vol
+        "charm": (sign * q * np.exp(-q * T) * cdf_d1
+                  - np.exp(-q * T) * pdf_d1 * (2 * (r - q) * T - d2 * sigma * sqrt_T) / (2 * T * sigma * sqrt_T)) / 365,  # delta per day
+    }
+    return {name: value[()] for name, value in greeks.items()}
+
+# closed-form American prices: the value and the early-exercise boundary, the spot
+# at or beyond which immediate exercise is optimal with T left (above it for calls,
+# below it for puts; inf or 0 when early exercise never pays)
+AmericanPrice = namedtuple("AmericanPrice", ["price", "boundary"])
+
+# with r >= 0 there is at most one exercise boundary, and early exercise never pays for
+# a call with q <= 0 or a put with r == 0. Negative rates can make early exercise of a
+# call optimal without dividends, or give two boundaries, which neither approximation
+# captures; use the binomial tree for those
+def _check_rates(r):
+    if np.any(r < 0):
+        raise ValueError("Closed-form American approximations need r >= 0, use method='binomial'")
+
+# Barone-Adesi-Whaley (1987) quadratic approximation. The critical spot solves the
+# smooth-pasting condition by Newton steps from Haug's seed, all contracts at once
+def barone_adesi_whaley(S, K, T, r, sigma, q, option_type="call", tol=1e-8, max_iter=50):
+    S, K, T, r, sigma, q, sign = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q)),
+        np.where(np.asarray(option_type) == "call", 1.0, -1.0))
+    _check_rates(r)
+    european = bs_price(S, K, T, r, sigma, q, np.where(sign > 0, "call", "put"))
+    early = np.where(sign > 0, q > 0, r > 0)
+
+    with np.errstate(all="ignore"):
+        vol = sigma * np.sqrt(T)
+        carry = np.exp(-q * T)
+        N = 2 * (r - q) / sigma ** 2
+        M = 2 * r / sigma ** 2
+        # M / (1 - exp(-rT)) tends to 2 / (sigma^2 T) as r -> 0
+        root = sign * np.sqrt((N - 1) ** 2 + 4 * np.where(r == 0, 2 / (sigma ** 2 * T), M / -np.expm1(-r * T)))
+        q2 = (1 - N + root) / 2
+
+        root_inf = sign * np.sqrt((N - 1) ** 2 + 4 * M)
+        S_inf = K / (1 - 2 / (1 - N + root_inf))  # the boundary as T -> infinity
+        h = -((r - q) * T + sign * 2 * vol) * K / (S_inf - K)
+        boundary = np.where(sign > 0, K + (S_inf - K) * -np.expm1(h), S_inf + (K - S_inf) * np.exp(h))
+
+        active = early.copy()
+        for _ in range(max_iter):
+            d1 = (np.log(boundary / K) + (r - q + 0.5 * sigma ** 2) * T) / vol
+            cdf_d1 = norm.cdf(sign * d1)
+            value = sign * (boundary * carry * cdf_d1 - K * np.exp(-r * T) * norm.cdf(sign * (d1 - vol)))
+            excess = (1 - carry * cdf_d1) / q2
+            f = sign * (boundary - K) - value - sign * excess * boundary
+            slope = sign * (1 - carry * cdf_d1 - excess) + carry * norm.pdf(d1) / (vol * q2)
+            active &= np.abs(f) > tol * K
+            if not active.any():
+                break
+            boundary = np.where(active, boundary - f / slope, boundary)
+
+        d1 = (np.log(boundary / K) + (r - q + 0.5 * sigma ** 2) * T) / vol
+        A = sign * boundary / q2 * (1 - carry * norm.cdf(sign * d1))
+        exercise = sign * (S - boundary) >= 0
+        price = np.where(exercise, sign * (S - K), european + A * (S / boundary) ** q2)
+
+    price = np.where(early, price, european)
+    boundary = np.where(early, boundary, np.where(sign > 0, np.inf, 0.0))
+    return AmericanPrice(price[()], boundary[()])
+
+# bivariate normal cdf M(a, b, rho) = P(X < a, Y < b) by Gauss-Legendre quadrature of
+# its integral over arcsin(rho); accurate to ~1e-12 for |rho| below 0.9, which covers
+# the fixed correlations of Bjerksund-Stensland
+_LEGENDRE_NODES, _LEGENDRE_WEIGHTS = np.polynomial.legendre.leggauss(20)
+
+def _bivariate_normal_cdf(a, b, rho):
+    a, b = np.asarray(a, dtype=float)[..., None], np.asarray(b, dtype=float)[..., None]
+    angle = np.arcsin(np.asarray(rho, dtype=float))[..., None]
+    sin = np.sin(angle * (1 + _LEGENDRE_NODES) / 2)
+    integrand = np.exp((sin * a * b - (a ** 2 + b ** 2) / 2) / (1 - sin ** 2))
+    return norm.cdf(a[..., 0]) * norm.cdf(b[..., 0]) + angle[..., 0] / (4 * np.pi) * (integrand @ _LEGENDRE_WEIGHTS)
+
+# the building blocks of Bjerksund-Stensland, with b the cost of carry r - q
+def _phi(S, T, gamma, H, I, r, b, sigma):
+    vol = sigma * np.sqrt(T)
+    drift = (b + (gamma - 0.5) * sigma ** 2) * T
+    lam = (-r + gamma * b + 0.5 * gamma * (gamma - 1) * sigma ** 2) * T
+    kappa = 2 * b / sigma ** 2 + 2 * gamma - 1
+    d = -(np.log(S / H) + drift) / vol
+    return np.exp(lam) * S ** gamma * (norm.cdf(d) - (I / S) ** kappa * norm.cdf(d - 2 * np.log(I / S) / vol))
+
+def _psi(S, T, gamma, H, I2, I1, t1, r, b, sigma):
+    mu = b + (gamma - 0.5) * sigma ** 2
+    vol1, vol = sigma * np.sqrt(t1), sigma * np.sqrt(T)
+    e1 = (np.log(S / I1) + mu * t1) / vol1
+    e2 = (np.log(I2 ** 2 / (S * I1)) + mu * t1) / vol1
+    e3 = (np.log(S / I1) - mu * t1) / vol1
+    e4 = (np.log(I2 ** 2 / (S * I1)) - mu * t1) / vol1
+    f1 = (np.log(S / H) + mu * T) / vol
+    f2 = (np.log(I2 ** 2 / (S * H)) + mu * T) / vol
+    f3 = (np.log(I1 ** 2 / (S * H)) + mu * T) / vol
+    f4 = (np.log(S * I1 ** 2 / (H * I2 ** 2)) + mu * T) / vol
+    rho = np.sqrt(t1 / T)
+    lam = (-r + gamma * b + 0.5 * gamma * (gamma - 1) * sigma ** 2) * T
+    kappa = 2 * b / sigma ** 2 + 2 * gamma - 1
+    return np.exp(lam) * S ** gamma * (_bivariate_normal_cdf(-e1, -f1, rho)
+                                       - (I2 / S) ** kappa * _bivariate_normal_cdf(-e2, -f2, rho)
+                                       - (I1 / S) ** kappa * _bivariate_normal_cdf(-e3, -f3, -rho)
+                                       + (I1 / I2) ** kappa * _bivariate_normal_cdf(-e4, -f4, -rho))
+
+# Bjerksund-Stensland (2002): exercise is approximated by a flat trigger I2 up to
+# t1 = (sqrt(5) - 1) / 2 * T and a second trigger I1 after it. Puts are priced as
+# calls through the put-call transformation P(S, K, r, q) = C(K, S, q, r), so the
+# boundary reported for a put is K * S / I2 of the transformed call
+def bjerksund_stensland(S, K, T, r, sigma, q, option_type="call"):
+    S, K, T, r, sigma, q, is_call = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q)), np.asarray(option_type) == "call")
+    _check_rates(r)
+    european = bs_price(S, K, T, r, sigma, q, np.where(is_call, "call", "put"))
+    S_, K_ = np.where(is_call, S, K), np.where(is_call, K, S)
+    r_, b = np.where(is_call, r, q), np.where(is_call, r - q, q - r)
+    early = b < r_
+
+    with np.errstate(all="ignore"):
+        t1 = 0.5 * (np.sqrt(5) - 1) * T
+        beta = (0.5 - b / sigma ** 2) + np.sqrt((b / sigma ** 2 - 0.5) ** 2 + 2 * r_ / sigma ** 2)
+        B_inf = beta / (beta - 1) * K_
+        B_0 = np.maximum(K_, r_ / (r_ - b) * K_)
+        h1 = -(b * t1 + 2 * sigma * np.sqrt(t1)) * K_ ** 2 / ((B_inf - B_0) * B_0)
+        h2 = -(b * T + 2 * sigma * np.sqrt(T)) * K_ ** 2 / ((B_inf - B_0) * B_0)
+        I1 = B_0 - (B_inf - B_0) * np.expm1(h1)
+        I2 = B_0 - (B_inf - B_0) * np.expm1(h2)
+        alpha1 = (I1 - K_) * I1 ** -beta
+        alpha2 = (I2 - K_) * I2 ** -beta
+
+        args = (r_, b, sigma)
+        price = (alpha2 * S_ ** beta - alpha2 * _phi(S_, t1, beta, I2, I2, *args)
+                 + _phi(S_, t1, 1, I2, I2, *args) - _phi(S_, t1, 1, I1, I2, *args)
+                 - K_ * _phi(S_, t1, 0, I2, I2, *args) + K_ * _phi(S_, t1, 0, I1, I2, *args)
+                 + alpha1 * _phi(S_, t1, beta, I1, I2, *args) - alpha1 * _psi(S_, T, beta, I1, I2, I1, t1, *args)
+                 + _psi(S_, T, 1, I1, I2, I1, t1, *args) - _psi(S_, T, 1, K_, I2, I1, t1, *args)
+                 - K_ * _psi(S_, T, 0, I1, I2, I1, t1, *args) + K_ * _psi(S_, T, 0, K_, I2, I1, t1, *args))
+        price = np.where(S_ >= I2, S_ - K_, price)
+        boundary = np.where(is_call, I2, K * S / I2)
+
+    price = np.where(early, price, european)
+    boundary = np.where(early, boundary, np.where(is_call, np.inf, 0.0))
+    return AmericanPrice(price[()], boundary[()])
+
+# American value by method: "binomial" (an n-step tree of the given flavour), "baw" or "bjerksund_stensland"
+AMERICAN_METHODS = ("binomial", "baw", "bjerksund_stensland")
+
+def american_price(S, K, T, r, sigma, q, option_type="call", method="bjerksund_stensland", n=100, tree="crr"):
+    if method == "binomial":
+        return binom_price(S, K, T, r, sigma, q, n, option_type, american=True, tree=tree)
+    if method == "baw":
+        return barone_adesi_whaley(S, K, T, r, sigma, q, option_type).price
+    if method == "bjerksund_stensland":
+        return bjerksund_stensland(S, K, T, r, sigma, q, option_type).price
+    raise ValueError(f"Unknown method {method!r}, expected one of {', '.join(AMERICAN_METHODS)}")
 
 def actual_option_price(tic, K, T, option_type):
-    ticker = yf.Ticker(tic)
     K = 5 * round(K/5) # round strike to nearest 5 for finding market prices
-    exp_dates = ticker.options
-    target_expiry = datetime.now() + timedelta(days=T * 365)
-    closest_expiry = min(exp_dates, key=lambda x: abs(datetime.strptime(x, '%Y-%m-%d') - target_expiry))
+    closest_expiry = marketdata.closest_expiry(tic, T)
 
-    option_chain = ticker.option_chain(closest_expiry)
+    option_chain = marketdata.option_chain(tic, closest_expiry)
     if option_type == "call":
         options = option_chain.calls
     else:
@@ -93,16 +342,74 @@ def actual_option_price(tic, K, T, option_type):
     else:
         return option_row['lastPrice'].values[0], closest_expiry
 
+EPS = np.finfo(float).eps
+
+# invert a whole chain at once: Corrado-Miller initial guess, then Halley steps
+# safeguarded by a per-contract bracket; returns the vols and a converged mask
+def implied_volatility_chain(option_price, S, K, T, r, q, option_type="call", tol=1e-8, max_iter=50):
+    price, S, K, T, r, q, sign = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (option_price, S, K, T, r, q)),
+        np.where(np.asarray(option_type) == "call", 1.0, -1.0))
+
+    S_disc = S * np.exp(-q * T)
+    K_disc = K * np.exp(-r * T)
+    lower = np.maximum(sign * (S_disc - K_disc), 0)
+    upper = np.where(sign > 0, S_disc, K_disc)
+    active = (price > lower) & (price < upper) & (T > 0)
+    converged = np.zeros(price.shape, dtype=bool)
+
+    with np.errstate(all="ignore"):
+        call_price = np.where(sign > 0, price, price + S_disc - K_disc)  # put-call parity
+        excess = call_price - (S_disc - K_disc) / 2
+        root = np.sqrt(np.maximum(excess ** 2 - (S_disc - K_disc) ** 2 / np.pi, 0))
+        sigma = np.sqrt(2 * np.pi / T) / (S_disc + K_disc) * (excess + root)
+
+        low = np.full(price.shape, 1e-6)
+        high = np.full(price.shape, 5.0)
+        sigma = np.where(np.isfinite(sigma) & (sigma > low) & (sigma < high), sigma, 0.3)
+
+        for _ in range(max_iter):
+            sqrt_T = np.sqrt(T)
+            d1 = (np.log(S_disc / K_disc) + 0.5 * sigma ** 2 * T) / (sigma * sqrt_T)
+            d2 = d1 - sigma * sqrt_T
+            diff = sign * (S_disc * norm.cdf(sign * d1) - K_disc * norm.cdf(sign * d2)) - price
+            vega = S_disc * norm.pdf(d1) * sqrt_T
+
+            # a small price error alone is not enough where vega vanishes (deep in/out of the
+            # money, short expiries): the vol step diff / vega, counting the rounding error of
+            # the price itself, must be small too. A bracket that collapses before that only
+            # means the price no longer pins down the vol
+            accurate = (np.abs(diff) < tol) & (np.abs(diff) + EPS * price < tol * vega)
+            converged |= active & accurate
+            active &= ~(accurate | ((high - low < 1e-12) & (high < 5.0)))
+            if not active.any():
+                break
+
+            high = np.where(active & (diff > 0), sigma, high)
+            low = np.where(active & (diff < 0), sigma, low)
+
+            newton = diff / vega
+            step = newton / (1 - 0.5 * newton * d1 * d2 / sigma)  # vomma / vega = d1 * d2 / sigma
+            candidate = sigma - step
+            outside = ~np.isfinite(candidate) | (candidate <= low) | (candidate >= high)
+            candidate = np.where(outside, 0.5 * (low + high), candidate)
+            sigma = np.where(active, candidate, sigma)
+
+    vols = np.where(converged, sigma, np.nan)
+    return vols[()], converged[()]
+
+# the vol is NaN wherever converged is False
+ImpliedVol = namedtuple("ImpliedVol", ["vol", "converged"])
+
 def implied_volatility(option_price, S, K, T, r, q, option_type):
-    try:
-        implied_vol = brentq(lambda x: bs_price(S, K, T, r, x, q, option_type) - option_price, 1e-10, 5)
-        return implied_vol
-    except ValueError:
-        return np.nan
+    return ImpliedVol(*implied_volatility_chain(option_price, S, K, T, r, q, option_type))
 
-def print_option_price(ticker, r, T, K, n, option_type="call", creation_date=None):
-    S_0, sigma = stock_data(ticker, creation_date)
-    q = div_yield(ticker)
+# S_0, sigma and q can be passed in to report on an existing snapshot
+def print_option_price(ticker, r, T, K, n, option_type="call", creation_date=None, S_0=None, sigma=None, q=None):
+    if S_0 is None or sigma is None:
+        S_0, sigma = stock_data(ticker, creation_date)
+    if q is None:
+        q = div_yield(ticker)
 
     params_table = [
         ["Ticker", ticker],
@@ -118,8 +425,14 @@ def print_option_price(ticker, r, T, K, n, option_type="call", creation_date=Non
     print("\n********** PRICES **********\n")
     european_price = binom_price(S_0, K, T, r, sigma, q, n, option_type=option_type, american=False)
     american_price = binom_price(S_0, K, T, r, sigma, q, n, option_type=option_type, american=True)
+    if r >= 0:
+        baw = f"${round(barone_adesi_whaley(S_0, K, T, r, sigma, q, option_type).price, 2)}"
+        bjerksund = f"${round(bjerksund_stensland(S_0, K, T, r, sigma, q, option_type).price, 2)}"
+    else:
+        baw = bjerksund = "N/A"  # negative rates are left to the tree
     black_scholes_price = bs_price(S_0, K, T, r, sigma, q, option_type=option_type)
-    monte_carlo_price = monte_carlo_european(S_0, K, T, r, q, sigma, option_type=option_type)
+    monte_carlo = montecarlo.monte_carlo_european(S_0, K, T, r, q, sigma, option_type=option_type,
+                                                  antithetic=True, control_variate=True)
 
     if creation_date is None:
         actual_price, exp = actual_option_price(ticker, K, T, option_type)
@@ -132,8 +445,10 @@ def print_option_price(ticker, r, T, K, n, option_type="call", creation_date=Non
     price_table = [
         ["Binomial", f"European {option_type}", target_exp, f"${round(european_price, 2)}"],
         ["Binomial", f"American {option_type}", target_exp, f"${round(american_price, 2)}"],
+        ["Barone-Adesi-Whaley", f"American {option_type}", target_exp, baw],
+        ["Bjerksund-Stensland", f"American {option_type}", target_exp, bjerksund],
         ["Black-Scholes", f"European {option_type}", target_exp, f"${round(black_scholes_price, 2)}"],
-        ["Monte Carlo", f"European {option_type}", target_exp, f"${round(monte_carlo_price, 2)}"],
+        ["Monte Carlo", f"European {option_type}", target_exp, f"${round(monte_carlo.price, 2)} ± {monte_carlo.std_error:.2f}"],
         ["Actual Market", f"European {option_type}", exp, f"${actual_price}"]
     ]
     print(tabulate(price_table, headers=["Model", "Option Type", "Expiry", "Price"], tablefmt="grid"))
@@ -141,11 +456,12 @@ def print_option_price(ticker, r, T, K, n, option_type="call", creation_date=Non
     print("\n********** VOLATILITY **********\n")
     if actual_price:
         iv = implied_volatility(actual_price, S_0, K, T, r, q, option_type)
+        implied = f"{iv.vol*100:.2f}%" if iv.converged else "did not converge"
     else:
-        iv = np.nan
+        implied = "N/A"
 
     vol_table = [
         ["Model", "--", f"{sigma*100:.2f}%"],
-        ["Implied", "Black-Scholes", f"{iv*100:.2f}%"]
+        ["Implied", "Black-Scholes", implied]
     ]
     print(tabulate(vol_table, headers=["Volatility Type", "Method", "Value"], tablefmt="grid"))
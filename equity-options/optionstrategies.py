@@ -1,5 +1,8 @@
 from option import create_option
-from optionspricing import stock_data
+from optionbook import OptionBook
+from scenarios import risk_ladder
+from payoff import Payoff
+from marketcontext import market_context
 import numpy as np
 import matplotlib.pyplot as plt
 from tabulate import tabulate
@@ -7,7 +10,8 @@ from tabulate import tabulate
 class OptionStrategy:
     def __init__(self, ticker, percent_otm_itm, expiry_date, rf, n=100, creation_date=None):
         self.ticker = ticker
-        self.stock_price, self.sigma = stock_data(ticker)
+        self.context = market_context(ticker, creation_date)  # shared by every leg
+        self.stock_price, self.sigma = self.context.S_0, self.context.sigma
         self.percent_otm_itm = percent_otm_itm
         self.expiry_date = expiry_date
         self.rf = rf
@@ -20,7 +24,8 @@ class OptionStrategy:
         self.total_market_price = 0
 
     def create_option(self, option_type, strike_price, position='long'):
-        option = create_option(self.ticker, self.rf, self.expiry_date, strike_price, self.n, option_type, position, creation_date=self.creation_date)
+        option = create_option(self.ticker, self.rf, self.expiry_date, strike_price, self.n, option_type, position,
+                               creation_date=self.creation_date, context=self.context)
         itm_otm = ""
         percent_itm_otm = abs((strike_price - self.stock_price) / self.stock_price)
 
@@ -73,10 +78,12 @@ class OptionStrategy:
         print(f"\n********** STRATEGY **********")
         print(f"{self.ticker} {self.percent_otm_itm*100}% {self.strategy_name}")
         print(f"******************************\n")
-        self.total_price = sum(option.price if option.position == 'long' else -option.price for option in self.options)
+        # stock legs cost nothing up front here: their payoff is already S - K
+        legs = [option for option in self.options if option.option_type != 'stock']
+        self.total_price = sum(option.price if option.position == 'long' else -option.price for option in legs)
         self.total_market_price = sum(
             option.market if option.position == 'long' else -1 * option.market
-            for option in self.options
+            for option in legs
             if option.market is not None
         )
         print(f"\n********** STRATEGY PRICE **********\n")
@@ -87,32 +94,16 @@ class OptionStrategy:
         print(tabulate(price_table, headers=["Type", "Price"], tablefmt="grid"))
         return self.total_price, self.total_market_price
 
+    def book(self):
+        return OptionBook.from_strategies([self])
+
+    # P&L and greeks over a spot x vol x days grid, see scenarios.risk_ladder
+    def risk_ladder(self, spot_shocks, vol_shocks=(0.0,), days=(0,), model="bs", n=None, american=False):
+        return risk_ladder(self.book(), spot_shocks, vol_shocks, days, model, n or self.n, american)
+
     def greeks(self):
-        delta = 0
-        gamma = 0
-        theta = 0
-        vega = 0
-        rho = 0
-
-        for option in self.options:
-            if option.option_type != 'stock':
-                if option.position == 'long':
-                    delta += option.delta
-                    gamma += option.gamma
-                    theta += option.theta
-                    vega += option.vega
-                    rho += option.rho
-                else:  # short position
-                    delta -= option.delta
-                    gamma -= option.gamma
-                    theta -= option.theta
-                    vega -= option.vega
-                    rho -= option.rho
-            else:  # for stock
-                if option.position == 'long':
-                    delta += 1
-                else:  # short stock position
-                    delta -= 1
+        totals = self.book().totals()
+        delta, gamma, theta, vega, rho = (totals[name] for name in ["delta", "gamma", "theta", "vega", "rho"])
 
         print(f"\n********** STRATEGY GREEKS **********\n")
         greeks_table = [
@@ -126,51 +117,39 @@ class OptionStrategy:
 
         return {"Delta": delta, "Gamma": gamma, "Theta": theta, "Vega": vega, "Rho": rho}
 
+    # exact expiry profit/loss net of the premium, see payoff.Payoff
+    def payoff(self, market_price=False):
+        book = self.book()
+        cost = self.total_market_price if market_price else self.total_price
+        return Payoff(book.option_type, book.strike, book.sign * book.quantity, -cost)
+
     def visualize_payoff(self, market_price=False):
-        stock_prices = np.linspace(self.stock_price * 0.5, self.stock_price * 1.5, 1000)
-        total_payoff = np.zeros_like(stock_prices)
-
-        for option in self.options:
-            if option.option_type == "call":
-                payoff = np.maximum(stock_prices - option.K, 0)
-            elif option.option_type == "put":
-                payoff = np.maximum(option.K - stock_prices, 0)
-            else:
-                payoff = stock_prices - option.K
+        payoff = self.payoff(market_price)
+        break_even_points = payoff.breakevens()
 
-            if option.position == 'long':
-                total_payoff += payoff
-            elif option.position == 'short':
-                total_payoff -= payoff
-
-        if market_price:
-            total_profit_loss = total_payoff - self.total_market_price
-        else:
-            total_profit_loss = total_payoff - self.total_price
+        # the window always shows every strike and breakeven; the line is drawn through the kinks only
+        marks = np.concatenate([payoff.kinks, break_even_points])
+        low = min(self.stock_price * 0.5, marks.min(initial=np.inf) * 0.9)
+        high = max(self.stock_price * 1.5, marks.max(initial=0) * 1.1)
+        stock_prices = np.unique(np.concatenate([[low, high], payoff.kinks]))
+        total_profit_loss = payoff(stock_prices)
 
         plt.figure(figsize=(10, 6))
         plt.plot(stock_prices, total_profit_loss, label=f'{self.strategy_name} P/L')
         plt.axhline(0, color='black', linestyle='--', linewidth=0.5)
 
-        break_even_points = []
-        for i in range(1, len(stock_prices)):
-            if total_profit_loss[i - 1] * total_profit_loss[i] < 0:  # Check for sign change
-                # linear interpolation to find the exact break-even point
-                x1, x2 = stock_prices[i - 1], stock_prices[i]
-                y1, y2 = total_profit_loss[i - 1], total_profit_loss[i]
-                break_even_point = x1 - y1 * (x2 - x1) / (y2 - y1)
-                break_even_points.append(break_even_point)
-
-        break_even_points = np.unique(np.round(break_even_points, 2))
-
         if len(break_even_points) == 0:
-            print("\nBreak-even points: N/A\n")
+            print("\nBreak-even points: N/A")
         else:
-            print(f"\nBreak-even points: {', '.join([f'{point:.2f}' for point in break_even_points])}\n")
+            print(f"\nBreak-even points: {', '.join([f'{point:.2f}' for point in break_even_points])}")
             for point in break_even_points:
                 plt.axvline(point, color='red', linestyle='--', linewidth=0.5)
                 plt.text(point, 0, f'{point:.2f}', verticalalignment='bottom')
 
+        max_profit, max_loss = payoff.max_profit(), payoff.max_loss()
+        print(f"Max profit: {'Unlimited' if np.isinf(max_profit) else f'{max_profit:.2f}'}")
+        print(f"Max loss: {'Unlimited' if np.isinf(max_loss) else f'{max_loss:.2f}'}\n")
+
         plt.xlabel('Stock Price')
         plt.ylabel('Profit/Loss')
         plt.title(f'{self.ticker} {self.percent_otm_itm * 100}% {self.strategy_name} Profit/Loss Diagram')
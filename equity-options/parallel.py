@@ -0,0 +1,9 @@
+from concurrent.futures import ProcessPoolExecutor
+
+# fn(*task) for every task, in task order: serially when workers is None or 1 (or there
+# is nothing to do), otherwise on a process pool of that many workers
+def pool_map(fn, tasks, workers=None):
+    if workers is None or workers == 1 or not tasks:
+        return [fn(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, *zip(*tasks)))
@@ -0,0 +1,47 @@
+import numpy as np
+
+from optionbook import CALL, PUT, STOCK
+
+# expiry profit/loss of vanilla and stock legs on one underlying, held exactly as a
+# piecewise-linear function: weight * max(S - K, 0) for calls, weight * max(K - S, 0)
+# for puts, weight * (S - K) for stock, plus a constant (minus the premium paid).
+# Only the kinks at the strikes are stored, so breakevens and extremes are exact and
+# cost O(legs log legs) with no price grid.
+class Payoff:
+    def __init__(self, option_type, strike, weight, constant=0.0):
+        option_type, strike, weight = np.broadcast_arrays(np.asarray(option_type), np.asarray(strike, dtype=float),
+                                                          np.asarray(weight, dtype=float))
+        calls, puts, stock = option_type == CALL, option_type == PUT, option_type == STOCK
+        options = calls | puts
+
+        self.kinks = np.unique(strike[options])
+        value_at_zero = constant + np.sum(weight[puts] * strike[puts]) - np.sum(weight[stock] * strike[stock])
+        left_slope = np.sum(weight[stock]) - np.sum(weight[puts])
+
+        # crossing a strike adds the leg's weight to the slope, for calls and puts alike
+        jumps = np.bincount(np.searchsorted(self.kinks, strike[options]), weights=weight[options],
+                            minlength=len(self.kinks))
+        self.slopes = left_slope + np.concatenate([[0.0], np.cumsum(jumps)])  # slopes[-1] is the right tail
+
+        self.points = np.concatenate([[0.0], self.kinks])
+        self.values = value_at_zero + np.concatenate([[0.0], np.cumsum(self.slopes[:-1] * np.diff(self.points))])
+
+    def __call__(self, S):
+        S = np.asarray(S, dtype=float)
+        tail = self.values[-1] + self.slopes[-1] * (S - self.points[-1])
+        return np.where(S > self.points[-1], tail, np.interp(S, self.points, self.values))[()]
+
+    def breakevens(self):
+        x, y = self.points, self.values
+        crossing = np.flatnonzero(y[:-1] * y[1:] < 0)
+        roots = [x[y == 0], x[crossing] - y[crossing] * (x[crossing + 1] - x[crossing]) / (y[crossing + 1] - y[crossing])]
+        if y[-1] * self.slopes[-1] < 0:
+            roots.append([x[-1] - y[-1] / self.slopes[-1]])
+        return np.unique(np.concatenate(roots))
+
+    def max_profit(self):
+        return np.inf if self.slopes[-1] > 0 else self.values.max()
+
+    # the lowest profit, negative for a loss
+    def max_loss(self):
+        return -np.inf if self.slopes[-1] < 0 else self.values.min()
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import weakref
+from collections import OrderedDict
+from scipy.signal import lfilter
+
+import marketdata
+
+TRADING_DAYS = 252
+EWMA_LAMBDA = 0.94  # RiskMetrics daily decay
+MAX_ESTIMATORS = 256  # series kept by realized_volatility, least recently used dropped first
+
+# per-bar terms kept as running (prefix) sums, so the mean or variance of any
+# window is two lookups
+TERMS = ["ret", "ret2", "parkinson", "garman_klass", "overnight", "overnight2", "intraday", "intraday2", "rogers_satchell"]
+
+# annualized realized volatility over a daily OHLC series that only ever grows:
+# new bars are appended in O(new bars) and every estimator answers any lookback
+# ending at any bar in O(1). The first bar has no previous close and only anchors
+# the returns, so a lookback of n needs n + 1 bars.
+class RealizedVolatility:
+    def __init__(self, lam=EWMA_LAMBDA, capacity=512):
+        self.lam = lam
+        self.size = 0
+        self.dates = np.empty(capacity, dtype="datetime64[ns]")
+        self.close = np.empty(capacity)
+        self._sums = {name: np.zeros(capacity + 1) for name in TERMS}
+        self._ewma = np.empty(capacity)  # EWMA variance after each bar
+
+    def __len__(self):
+        return self.size
+
+    # appends the bars of an OHLC frame dated after the last bar held. A bar dated the
+    # same as the last one held replaces it (today's partial bar moves during the session).
+    # Closes are split and dividend adjusted, so if any earlier bar the frame shares with
+    # the series has changed, the whole history was re-adjusted and the series starts over
+    def update(self, frame):
+        if frame.empty:
+            return self
+        dates = frame.index
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        dates = dates.values.astype("datetime64[ns]")
+        if self.size:
+            held = np.searchsorted(self.dates[:self.size - 1], dates)
+            shared = held < self.size - 1
+            shared[shared] = self.dates[held[shared]] == dates[shared]
+            if not np.allclose(self.close[held[shared]], frame["Close"].values[shared], rtol=1e-9, atol=0):
+                self.size = 0
+        new = dates >= self.dates[self.size - 1] if self.size else np.ones(len(dates), dtype=bool)
+        if new.any():
+            if self.size and dates[new][0] == self.dates[self.size - 1]:
+                self.size -= 1  # running sums and EWMA before it are untouched
+            self.extend(dates[new], *(frame[column].values[new] for column in ["Open", "High", "Low", "Close"]))
+        return self
+
+    def extend(self, dates, open_, high, low, close):
+        open_, high, low, close = (np.asarray(x, dtype=float) for x in (open_, high, low, close))
+        start, end = self.size, self.size + len(close)
+        self._reserve(end)
+
+        previous = np.concatenate([self.close[start - 1:start], close[:-1]])
+        # the first bar of the series has no previous close: its return terms are zero
+        ret = np.log(close / previous) if start else np.concatenate([[0.0], np.log(close[1:] / close[:-1])])
+        overnight = np.log(open_ / previous) if start else np.concatenate([[0.0], np.log(open_[1:] / close[:-1])])
+        high_low, intraday = np.log(high / low), np.log(close / open_)
+        terms = {
+            "ret": ret,
+            "ret2": ret ** 2,
+            "parkinson": high_low ** 2 / (4 * np.log(2)),
+            "garman_klass": 0.5 * high_low ** 2 - (2 * np.log(2) - 1) * intraday ** 2,
+            "overnight": overnight,
+            "overnight2": overnight ** 2,
+            "intraday": intraday,
+            "intraday2": intraday ** 2,
+            "rogers_satchell": np.log(high / close) * np.log(high / open_) + np.log(low / close) * np.log(low / open_),
+        }
+        for name, values in terms.items():
+            self._sums[name][start + 1:end + 1] = self._sums[name][start] + np.cumsum(values)
+
+        # var_t = lam * var_{t-1} + (1 - lam) * r_t^2, seeded with the first squared return
+        squared = ret ** 2
+        if start:
+            initial = self.lam * self._ewma[start - 1]
+        else:
+            squared[0] = squared[1] if len(squared) > 1 else 0.0
+            initial = self.lam * squared[0]
+        self._ewma[start:end] = lfilter([1 - self.lam], [1, -self.lam], squared, zi=[initial])[0]
+
+        self.dates[start:end] = dates
+        self.close[start:end] = close
+        self.size = end
+
+    def _reserve(self, size):
+        capacity = len(self.close)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        self.dates = np.resize(self.dates, capacity)
+        self.close = np.resize(self.close, capacity)
+        self._ewma = np.resize(self._ewma, capacity)
+        for name in TERMS:
+            self._sums[name] = np.resize(self._sums[name], capacity + 1)
+
+    # index of the last bar on or before end (a date), or the latest bar
+    def _end(self, end):
+        if end is None:
+            return self.size - 1
+        end = pd.Timestamp(end)
+        if end.tz is not None:
+            end = end.tz_localize(None)
+        return int(np.searchsorted(self.dates[:self.size], np.datetime64(end, "ns"), side="right")) - 1
+
+    def _window(self, lookback, end):
+        stop = self._end(end) + 1
+        start = stop - lookback
+        if start < 1:
+            raise ValueError(f"A lookback of {lookback} days needs {lookback + 1} bars, {stop} available")
+        return start, stop
+
+    def _mean(self, name, start, stop):
+        return (self._sums[name][stop] - self._sums[name][start]) / (stop - start)
+
+    def _variance(self, name, start, stop, ddof=1):
+        n = stop - start
+        total = self._sums[name][stop] - self._sums[name][start]
+        squares = self._sums[name + "2"][stop] - self._sums[name + "2"][start]
+        return max(squares - total ** 2 / n, 0.0) / (n - ddof)
+
+    def close_to_close(self, lookback=21, end=None, ddof=1):
+        start, stop = self._window(lookback, end)
+        return np.sqrt(self._variance("ret", start, stop, ddof) * TRADING_DAYS)
+
+    def ewma(self, end=None):
+        return np.sqrt(self._ewma[self._end(end)] * TRADING_DAYS)
+
+    def parkinson(self, lookback=21, end=None):
+        start, stop = self._window(lookback, end)
+        return np.sqrt(self._mean("parkinson", start, stop) * TRADING_DAYS)
+
+    def garman_klass(self, lookback=21, end=None):
+        start, stop = self._window(lookback, end)
+        return np.sqrt(max(self._mean("garman_klass", start, stop), 0.0) * TRADING_DAYS)
+
+    # overnight variance + k * open-to-close variance + (1 - k) * Rogers-Satchell
+    def yang_zhang(self, lookback=21, end=None):
+        start, stop = self._window(lookback, end)
+        n = stop - start
+        if n < 2:
+            raise ValueError("Yang-Zhang needs a lookback of at least 2 days")
+        k = 0.34 / (1.34 + (n + 1) / (n - 1))
+        variance = (self._variance("overnight", start, stop) + k * self._variance("intraday", start, stop)
+                    + (1 - k) * self._mean("rogers_satchell", start, stop))
+        return np.sqrt(variance * TRADING_DAYS)
+
+# per data source, dropped with it so a new provider never inherits its series
+_estimators = weakref.WeakKeyDictionary()
+
+# one growing series per data source, ticker and end date, topped up from the
+# market-data history (itself cached) instead of being recomputed on every call
+def realized_volatility(ticker, date=None):
+    estimators = _estimators.setdefault(marketdata.provider, OrderedDict())
+    estimator = estimators.pop((ticker, date), None)
+    if estimator is None:
+        estimator = RealizedVolatility()
+    estimators[ticker, date] = estimator
+    if len(estimators) > MAX_ESTIMATORS:
+        estimators.popitem(last=False)
+    return estimator.update(marketdata.history(ticker, date))
@@ -1,7 +1,13 @@
+import os
+import json
+import time
 import numpy as np
+from collections import namedtuple
 import scipy.optimize as opt
-import yfinance as yf
-from datetime import datetime, timedelta
+from tabulate import tabulate
+import marketdata
+from volsurface import slice_data
+from parallel import pool_map
 import matplotlib.pyplot as plt
 
 class SABRModel:
@@ -11,57 +17,115 @@ class SABRModel:
         self.rho = rho      # Correlation between F and volatility
         self.nu = nu        # Volatility of volatility
     
+    @property
+    def params(self):
+        return self.alpha, self.beta, self.rho, self.nu
+
     def sabr_vol(self, F, K, T):
-        if K == F:
-            ATM_vol = self.alpha / (F**(1 - self.beta))
-            return ATM_vol
-        
-        z = self.nu / self.alpha * (F * K) ** ((1 - self.beta) / 2) * np.log(F / K)
-        x = np.log((np.sqrt(1 - 2 * self.rho * z + z**2) + z - self.rho) / (1 - self.rho))
-        
-        vol = (self.alpha / ((F * K) ** ((1 - self.beta) / 2))) * (z / x)
-        return vol
-
-    def calibrate_sabr(self, market_strikes, market_vols, F, T):
-        def error(params):
-            alpha, beta, rho, nu = params
-            self.alpha, self.beta, self.rho, self.nu = alpha, beta, rho, nu
-            model_vols = [self.sabr_vol(F, K, T) for K in market_strikes]
-            return np.sum((np.array(model_vols) - np.array(market_vols))**2)
-        
-        initial_guess = [self.alpha, self.beta, self.rho, self.nu]
-        bounds = [(0, None), (0, 1), (-1, 1), (0, None)]
-        opt_params = opt.minimize(error, initial_guess, bounds=bounds).x
-        self.alpha, self.beta, self.rho, self.nu = opt_params
-
-        return opt_params
+        return hagan_vol(F, K, T, *self.params)
+
+    # least squares on vols with the analytic Jacobian of hagan_vol, starting from the
+    # current parameters; fix_beta keeps beta at its current value
+    def calibrate_sabr(self, market_strikes, market_vols, F, T, fix_beta=False, weights=None):
+        result = fit_sabr(market_strikes, market_vols, F, T, self.params, fix_beta, weights)
+        self.alpha, self.beta, self.rho, self.nu = result.params
+        return np.array(result.params)
+
+ZERO_Z = 1e-6  # below this |z| the z / x(z) factor is replaced by its series
+
+# Hagan et al. (2002) lognormal SABR vol, including the (1-beta) log-moneyness terms
+# and the time correction; arrays broadcast, and the ATM limit needs no branch
+def hagan_vol(F, K, T, alpha, beta, rho, nu):
+    return _hagan(F, K, T, alpha, beta, rho, nu)[0]
+
+# returns the vol and, with jacobian=True, its derivatives by alpha, beta, rho, nu
+# stacked on the last axis
+def _hagan(F, K, T, alpha, beta, rho, nu, jacobian=False):
+    F, K, T = (np.asarray(x, dtype=float) for x in (F, K, T))
+    L = np.log(F / K)
+    half_log_FK = 0.5 * np.log(F * K)
+    P = np.exp((1 - beta) * half_log_FK)  # (FK)^((1-beta)/2)
+    D = 1 + (1 - beta) ** 2 * L ** 2 / 24 + (1 - beta) ** 4 * L ** 4 / 1920
+
+    z = nu * P * L / alpha
+    small = np.abs(z) < ZERO_Z
+    z_safe = np.where(small, 1.0, z)
+    root = np.sqrt(1 - 2 * rho * z_safe + z_safe ** 2)
+    # root + z - rho cancels for large negative z; use (1 - rho^2) / (root - z + rho) there
+    shifted = np.where(z_safe < rho, (1 - rho ** 2) / (root - z_safe + rho), root + z_safe - rho)
+    x = np.log(shifted / (1 - rho))
+    R = np.where(small, 1 - rho * z / 2 + (2 - 3 * rho ** 2) * z ** 2 / 12, z_safe / x)
+
+    A1 = (1 - beta) ** 2 * alpha ** 2 / (24 * P ** 2)
+    A2 = rho * beta * nu * alpha / (4 * P)
+    A3 = (2 - 3 * rho ** 2) * nu ** 2 / 24
+    C = 1 + (A1 + A2 + A3) * T
+
+    vol = alpha / (P * D) * R * C
+    if not jacobian:
+        return vol, None
+
+    # d R / d z and d R / d rho at fixed z, with the same series near z = 0
+    dR_dz = np.where(small, -rho / 2 + (2 - 3 * rho ** 2) * z / 6, (x - z_safe / root) / x ** 2)
+    dx_drho = (-z_safe / root - 1) / shifted + 1 / (1 - rho)
+    dR_drho = np.where(small, -z / 2 - rho * z ** 2 / 2, -z_safe / x ** 2 * dx_drho)
+
+    dD_dbeta = -(2 * (1 - beta) * L ** 2 / 24 + 4 * (1 - beta) ** 3 * L ** 4 / 1920)
+    dC_dalpha = (2 * A1 / alpha + rho * beta * nu / (4 * P)) * T
+    dC_dbeta = (-2 * (1 - beta) * alpha ** 2 / (24 * P ** 2) + 2 * half_log_FK * A1
+                + rho * nu * alpha / (4 * P) + half_log_FK * A2) * T
+    dC_drho = (beta * nu * alpha / (4 * P) - rho * nu ** 2 / 4) * T
+    dC_dnu = (rho * beta * alpha / (4 * P) + (2 - 3 * rho ** 2) * nu / 12) * T
+
+    jac = np.stack(np.broadcast_arrays(
+        vol * (1 / alpha - dR_dz * z / (alpha * R) + dC_dalpha / C),
+        vol * (half_log_FK - dD_dbeta / D - dR_dz * half_log_FK * z / R + dC_dbeta / C),
+        vol * (dR_drho / R + dC_drho / C),
+        vol * (dR_dz * P * L / (alpha * R) + dC_dnu / C)), axis=-1)
+    return vol, jac
+
+SABRFit = namedtuple("SABRFit", ["params", "rmse", "nfev", "success"])
+
+# beta is held at initial[1] when fix_beta is set
+def fit_sabr(strikes, market_vols, F, T, initial, fix_beta=False, weights=None):
+    strikes = np.asarray(strikes, dtype=float)
+    market_vols = np.asarray(market_vols, dtype=float)
+    weights = np.ones_like(market_vols) if weights is None else np.asarray(weights, dtype=float)
+    beta = initial[1]
+    free = [0, 2, 3] if fix_beta else [0, 1, 2, 3]
+
+    def full(params):
+        params = list(params)
+        return params[:1] + [beta] + params[1:] if fix_beta else params
+
+    def residuals(params):
+        return weights * (_hagan(F, strikes, T, *full(params))[0] - market_vols)
+
+    def jacobian(params):
+        return weights[:, None] * _hagan(F, strikes, T, *full(params), jacobian=True)[1][:, free]
+
+    lower = np.array([1e-8, 0, -0.999, 0])[free]
+    upper = np.array([np.inf, 1, 0.999, np.inf])[free]
+    initial = np.clip(np.asarray(initial, dtype=float)[free], lower, upper)
+
+    result = opt.least_squares(residuals, initial, jac=jacobian, bounds=(lower, upper), method="dogbox")
+    rmse = np.sqrt(np.mean((result.fun / weights) ** 2))
+    return SABRFit(tuple(full(result.x)), rmse, result.nfev, result.success)
 
 def get_iv(tic, K, T, option_type):
-    ticker = yf.Ticker(tic)
     K = 5 * round(K / 5)  # Round strike to nearest 5 for finding market prices
-    exp_dates = ticker.options
-    target_expiry = datetime.now() + timedelta(days=T * 365)
-    closest_expiry = min(exp_dates, key=lambda x: abs(datetime.strptime(x, '%Y-%m-%d') - target_expiry))
+    closest_expiry = marketdata.closest_expiry(tic, T)
     
-    option_chain = ticker.option_chain(date=closest_expiry)
+    option_chain = marketdata.option_chain(tic, closest_expiry)
     options = option_chain.calls if option_type == "call" else option_chain.puts
     
     option_row = options[options['strike'] == K]
     return option_row['impliedVolatility'].values[0] if not option_row.empty else None
 
 def plot_sabr_vol_smile(ticker, expiry_years, F, sabr_model):
-    today = datetime.today()
-    expiry_date = today + timedelta(days=expiry_years * 365)
-    ticker_obj = yf.Ticker(ticker)
-    options = ticker_obj.options
-
-    if not options:
-        raise ValueError(f"No options data available for ticker {ticker}")
-
-    option_dates = [datetime.strptime(exp_date, '%Y-%m-%d') for exp_date in options]
-    expiry_date_str = min(option_dates, key=lambda x: abs(x - expiry_date)).strftime('%Y-%m-%d')
+    expiry_date_str = marketdata.closest_expiry(ticker, expiry_years)
 
-    option_chain = ticker_obj.option_chain(date=expiry_date_str)
+    option_chain = marketdata.option_chain(ticker, expiry_date_str)
     calls = option_chain.calls
 
     strikes = calls['strike'].values
@@ -71,7 +135,7 @@ def plot_sabr_vol_smile(ticker, expiry_years, F, sabr_model):
     strikes = strikes[valid_indices]
     implied_vols = implied_vols[valid_indices]
 
-    model_vols = [sabr_model.sabr_vol(F, K, expiry_years) for K in strikes]
+    model_vols = sabr_model.sabr_vol(F, strikes, expiry_years)
     
     plt.figure(figsize=(8, 5))
     plt.plot(strikes, implied_vols, label='Market IV', marker='o', linestyle='-', color='blue')
@@ -83,9 +147,79 @@ def plot_sabr_vol_smile(ticker, expiry_years, F, sabr_model):
     plt.grid(True)
     plt.show()
 
-# Example Usage
-sabr = SABRModel(alpha=0.2, beta=0.5, rho=-0.3, nu=0.4)
-ticker = input("Enter ticker: ")
-T = int(input("Enter expiry (years): "))
-F = int(input("Enter F: "))
-plot_sabr_vol_smile(ticker, T, F, sabr)
+# batch calibration: every (ticker, expiry) slice fitted on a process pool, each
+# warm-started from the parameters of the previous run kept in a JSON store
+
+PARAMS_PATH = os.environ.get("SABR_PARAMS_PATH",
+                             os.path.join(os.path.expanduser("~"), ".cache", "financial-engineering", "sabr_params.json"))
+DEFAULT_PARAMS = (0.2, 0.5, -0.3, 0.4)  # alpha is replaced by the ATM level on a cold start
+
+SABRReport = namedtuple("SABRReport", ["ticker", "expiry", "params", "rmse", "nfev", "seconds", "success"])
+
+def load_params(path=PARAMS_PATH):
+    try:
+        with open(path) as f:
+            return {key: tuple(params) for key, params in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+def save_params(params, path=PARAMS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({key: [float(x) for x in value] for key, value in params.items()}, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def _calibrate_task(strikes, vols, F, T, initial, fix_beta):
+    start = time.perf_counter()
+    result = fit_sabr(strikes, vols, F, T, initial, fix_beta)
+    return result, time.perf_counter() - start
+
+# expiries=None fits every listed expiry; beta fixes beta for all slices. Market data
+# is read here, only the fits go to the workers
+def batch_calibrate(tickers, r, expiries=None, beta=None, workers=None, path=PARAMS_PATH):
+    store = load_params(path)
+    slices, tasks = [], []
+    for ticker in tickers:
+        S_0 = marketdata.history(ticker)['Close'].iloc[-1]
+        q = marketdata.dividend_yield(ticker)
+        for expiry in (expiries or marketdata.expiries(ticker)):
+            T = marketdata.time_to_expiry(expiry)
+            strikes, vols = slice_data(marketdata.option_chain(ticker, expiry), S_0)
+            if T <= 0 or len(strikes) < 4:
+                continue
+            F = S_0 * np.exp((r - q) * T)
+
+            initial = store.get(f"{ticker} {expiry}")
+            if initial is None:
+                b = DEFAULT_PARAMS[1] if beta is None else beta
+                atm_vol = vols[np.argmin(np.abs(strikes - F))]
+                initial = (atm_vol * F ** (1 - b), b) + DEFAULT_PARAMS[2:]
+            elif beta is not None:  # rescale alpha to keep the ATM vol alpha / F^(1-beta)
+                initial = (initial[0] * F ** (initial[1] - beta), beta) + tuple(initial[2:])
+            slices.append((ticker, expiry))
+            tasks.append((strikes, vols, F, T, initial, beta is not None))
+
+    results = pool_map(_calibrate_task, tasks, workers)
+
+    reports = []
+    for (ticker, expiry), (result, seconds) in zip(slices, results):
+        if result.success:
+            store[f"{ticker} {expiry}"] = result.params
+        reports.append(SABRReport(ticker, expiry, result.params, result.rmse, result.nfev, seconds, result.success))
+    save_params(store, path)
+    return reports
+
+def print_reports(reports):
+    rows = [[report.ticker, report.expiry] + [f"{x:.4f}" for x in report.params]
+            + [f"{report.rmse:.5f}", report.nfev, f"{report.seconds * 1000:.1f}", "yes" if report.success else "no"]
+            for report in reports]
+    headers = ["Ticker", "Expiry", "Alpha", "Beta", "Rho", "Nu", "RMSE", "Evaluations", "Time (ms)", "Converged"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+if __name__ == "__main__":
+    # Example Usage
+    sabr = SABRModel(alpha=0.2, beta=0.5, rho=-0.3, nu=0.4)
+    ticker = input("Enter ticker: ")
+    T = int(input("Enter expiry (years): "))
+    F = int(input("Enter F: "))
+    plot_sabr_vol_smile(ticker, T, F, sabr)
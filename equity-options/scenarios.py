@@ -0,0 +1,86 @@
+import numpy as np
+from collections import namedtuple
+from tabulate import tabulate
+
+from optionbook import position_greeks, STOCK, CALL, GREEKS
+from optionspricing import binom_price
+
+BATCH_ELEMENTS = 2 ** 21  # grid points x positions evaluated at once
+MIN_VOL = 1e-4  # floor for shocked volatilities
+
+RiskLadder = namedtuple("RiskLadder", ["spot_shocks", "vol_shocks", "days", "value", "pnl", "greeks"])
+
+# reprices an OptionBook over spot shocks (relative, -0.1 is a 10% drop) x vol shocks
+# (absolute, 0.05 is +5 vol points) x days elapsed in one broadcast evaluation.
+# value and pnl are (spot, vol, days) cubes and greeks a dict of cubes. With
+# model="binomial" values come from the CRR lattice (american=True allows early
+# exercise); greeks are Black-Scholes either way
+def risk_ladder(book, spot_shocks, vol_shocks=(0.0,), days=(0,), model="bs", n=100, american=False):
+    if model not in ("bs", "binomial"):
+        raise ValueError(f"Unknown model {model!r}, expected 'bs' or 'binomial'")
+    spot_shocks, vol_shocks, days = (np.atleast_1d(np.asarray(x, dtype=float)) for x in (spot_shocks, vol_shocks, days))
+    grid = (len(spot_shocks), len(vol_shocks), len(days))
+    ds = spot_shocks.reshape(-1, 1, 1, 1)
+    dv = vol_shocks.reshape(1, -1, 1, 1)
+    dt = days.reshape(1, 1, -1, 1) / 365
+
+    ids = book.ticker_id
+    vol = book.position_vol()
+    weight = book.sign * book.quantity
+    greeks = {name: np.zeros(grid) for name in ["price"] + GREEKS}
+    step = max(1, BATCH_ELEMENTS // int(np.prod(grid)))
+    for start in range(0, len(book), step):
+        rows = slice(start, start + step)
+        chunk = position_greeks(book.option_type[rows], book.S_0[ids[rows]] * (1 + ds), book.strike[rows],
+                                book.expiry[rows] - dt, book.rate[rows],
+                                np.maximum(vol[rows] + dv, MIN_VOL), book.q[ids[rows]])
+        for name in greeks:
+            greeks[name] += chunk[name] @ weight[rows]
+
+    value = greeks.pop("price")
+    base = book.totals()["price"]
+    if model == "binomial":
+        value = _binomial_values(book, spot_shocks, vol_shocks, days, n, american)
+        base = _binomial_values(book, [0.0], [0.0], [0.0], n, american)[0, 0, 0]
+
+    return RiskLadder(spot_shocks, vol_shocks, days, value, value - base, greeks)
+
+# one lattice per underlying, expiry, rate, vol, vol shock and day; all spot shocks
+# and strikes sharing it are rolled back together
+def _binomial_values(book, spot_shocks, vol_shocks, days, n, american):
+    spot = 1 + np.asarray(spot_shocks, dtype=float)
+    value = np.zeros((len(spot), len(vol_shocks), len(days)))
+    weight = book.sign * book.quantity
+
+    stock = book.option_type == STOCK
+    stock_value = np.sum(book.S_0[book.ticker_id[stock]] * weight[stock])
+    value += stock_value * spot.reshape(-1, 1, 1)
+
+    options = np.flatnonzero(~stock)
+    keys = np.column_stack([book.ticker_id[options], book.expiry[options], book.rate[options],
+                            book.position_vol()[options]])
+    groups, group_of = np.unique(keys, axis=0, return_inverse=True)
+    for g, (i, T, r, vol) in enumerate(groups):
+        rows = options[group_of.ravel() == g]
+        i = int(i)
+        S = book.S_0[i] * spot.reshape(-1, 1)
+        K = book.strike[rows]
+        option_type = np.where(book.option_type[rows] == CALL, "call", "put")
+        for j, dv in enumerate(vol_shocks):
+            sigma = max(vol + dv, MIN_VOL)
+            for k, day in enumerate(days):
+                T_left = T - day / 365
+                if T_left <= 0:
+                    prices = np.maximum(np.where(option_type == "call", 1.0, -1.0) * (S - K), 0)
+                else:
+                    prices = binom_price(S, K, T_left, r, sigma, book.q[i], n, option_type, american)
+                value[:, j, k] += prices @ weight[rows]
+    return value
+
+# P&L by spot shock (rows) and vol shock (columns) after days[day] days
+def print_ladder(ladder, day=0):
+    print(f"\n********** P&L AFTER {ladder.days[day]:g} DAYS **********\n")
+    rows = [[f"{shock * 100:+.1f}%"] + [f"{pnl:.2f}" for pnl in ladder.pnl[i, :, day]]
+            for i, shock in enumerate(ladder.spot_shocks)]
+    headers = ["Spot \\ Vol"] + [f"{shock * 100:+.1f}" for shock in ladder.vol_shocks]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
@@ -1,5 +1,6 @@
 import numpy as np
-from scipy.optimize import minimize
+from scipy.optimize import least_squares
+from scipy.stats import norm
 import matplotlib.pyplot as plt
 import yfinance as yf
 
@@ -16,27 +17,49 @@ class SVIModel:
             self.a + self.b * (self.rho * (k - self.m) + np.sqrt((k - self.m)**2 + self.sigma**2))
         )
 
-    def fit(self, strikes, market_vols, forward_price):
-        log_moneyness = np.log(np.array(strikes) / forward_price)
+    @property
+    def params(self):
+        return self.a, self.b, self.rho, self.m, self.sigma
+
+    # least squares on vols with the analytic Jacobian of the raw SVI variance
+    # w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + sigma^2)). weights scale each
+    # residual (see vega_weights, spread_weights); initial warm-starts from earlier
+    # parameters, otherwise the guess is read off the smile itself
+    def fit(self, strikes, market_vols, forward_price, weights=None, initial=None):
+        log_moneyness = np.log(np.asarray(strikes, dtype=float) / forward_price)
+        market_vols = np.asarray(market_vols, dtype=float)
+        weights = np.ones_like(market_vols) if weights is None else np.asarray(weights, dtype=float)
+
+        def residuals(params):
+            a, b, rho, m, sigma = params
+            u = log_moneyness - m
+            root = np.sqrt(u ** 2 + sigma ** 2)
+            return weights * (np.sqrt(a + b * (rho * u + root)) - market_vols)
 
-        def objective(params):
+        def jacobian(params):
             a, b, rho, m, sigma = params
-            self.a, self.b, self.rho, self.m, self.sigma = a, b, rho, m, sigma
-            model_vols = np.array([self.svi_volatility(k) for k in log_moneyness])
-            return np.sum((market_vols - model_vols)**2)
+            u = log_moneyness - m
+            root = np.sqrt(u ** 2 + sigma ** 2)
+            dw = np.column_stack([np.ones_like(u), rho * u + root, b * u, -b * (rho + u / root), b * sigma / root])
+            return (weights / (2 * np.sqrt(a + b * (rho * u + root))))[:, None] * dw
 
-        initial_guess = [0.1, 0.1, 0, 0, 0.1]
-        bounds = [(0, None), (0, None), (-1, 1), (None, None), (0, None)]
+        if initial is None:
+            initial = initial_guess(log_moneyness, market_vols)
+        elif isinstance(initial, SVIModel):
+            initial = initial.params
+        lower, upper = [0, 0, -1, -np.inf, 1e-8], [np.inf, np.inf, 1, np.inf, np.inf]
+        initial = np.clip(initial, lower, upper)
 
-        result = minimize(objective, initial_guess, bounds=bounds)
+        result = least_squares(residuals, initial, jac=jacobian, bounds=(lower, upper), method="dogbox")
         if not result.success:
             raise ValueError("SVI model fitting failed")
 
         self.a, self.b, self.rho, self.m, self.sigma = result.x
+        return self
 
     def plot_volatility_surface(self, strikes, forward_price, market_vols):
         log_moneyness = np.log(np.array(strikes) / forward_price)
-        model_vols = [self.svi_volatility(k) for k in log_moneyness]
+        model_vols = self.svi_volatility(log_moneyness)
 
         plt.figure(figsize=(10, 6))
         plt.plot(strikes, market_vols, 'o', label='Market Volatilities', color='blue')
@@ -46,4 +69,32 @@ class SVIModel:
         plt.ylabel('Implied Volatility')
         plt.legend()
         plt.grid()
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+# start at the bottom of the smile with the wing slopes of the observed variance:
+# far from m the slope of w is b * (rho - 1) on the left and b * (rho + 1) on the right
+def initial_guess(log_moneyness, market_vols):
+    order = np.argsort(log_moneyness)
+    k, w = log_moneyness[order], market_vols[order] ** 2
+    bottom = np.argmin(w)
+    m = k[bottom]
+
+    left = (w[0] - w[bottom]) / (k[0] - m) if bottom > 0 else -0.1
+    right = (w[-1] - w[bottom]) / (k[-1] - m) if bottom < len(k) - 1 else 0.1
+    b = max((right - left) / 2, 1e-3)
+    rho = np.clip((right + left) / (2 * b), -0.9, 0.9)
+    sigma = 0.1
+    a = max(w[bottom] - b * sigma * np.sqrt(1 - rho ** 2), 0)
+    return [a, b, rho, m, sigma]
+
+# weights that make the fit an approximate price fit: Black vega of each quote
+def vega_weights(strikes, forward_price, market_vols, T=1.0):
+    strikes, market_vols = np.asarray(strikes, dtype=float), np.asarray(market_vols, dtype=float)
+    d1 = (np.log(forward_price / strikes) + 0.5 * market_vols ** 2 * T) / (market_vols * np.sqrt(T))
+    vega = forward_price * norm.pdf(d1) * np.sqrt(T)
+    return vega / vega.max()
+
+# tight quotes count more: inverse bid-ask spread, bid and ask in vol (or price) units
+def spread_weights(bid, ask, floor=1e-4):
+    spread = np.maximum(np.asarray(ask, dtype=float) - np.asarray(bid, dtype=float), floor)
+    return spread.min() / spread
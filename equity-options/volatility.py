@@ -1,15 +1,11 @@
-import yfinance as yf
-from datetime import datetime, timedelta
+import marketdata
 import matplotlib.pyplot as plt
 
 def get_iv(tic, K, T, option_type):
-    ticker = yf.Ticker(tic)
     K = 5 * round(K / 5)  # Round strike to nearest 5 for finding market prices
-    exp_dates = ticker.options
-    target_expiry = datetime.now() + timedelta(days=T * 365)
-    closest_expiry = min(exp_dates, key=lambda x: abs(datetime.strptime(x, '%Y-%m-%d') - target_expiry))
+    closest_expiry = marketdata.closest_expiry(tic, T)
 
-    option_chain = ticker.option_chain(date=closest_expiry)
+    option_chain = marketdata.option_chain(tic, closest_expiry)
     if option_type == "call":
         options = option_chain.calls
     else:
@@ -22,18 +18,6 @@ def get_iv(tic, K, T, option_type):
         return option_row['impliedVolatility'].values[0]
 
 def vol_skew(ticker, expiry_years, strike):
-    today = datetime.today()
-    expiry_date = today + timedelta(days=expiry_years * 365)
-    ticker_obj = yf.Ticker(ticker)
-    options = ticker_obj.options
-
-    if not options:
-        raise ValueError(f"No options data available for ticker {ticker}")
-
-    option_dates = [datetime.strptime(exp_date, '%Y-%m-%d') for exp_date in options]
-    expiry_date_str = min(option_dates, key=lambda x: abs(x - expiry_date)).strftime('%Y-%m-%d')
-
-    option_chain = ticker_obj.option_chain(date=expiry_date_str)
     vol_at_strike = get_iv(ticker, strike, expiry_years, 'call')
     if vol_at_strike is None:
         raise ValueError(f"No implied volatility data available for strike {strike}")
@@ -51,31 +35,12 @@ def vol_skew(ticker, expiry_years, strike):
     return skew
 
 def get_expiry_date(ticker, expiry_years):
-    today = datetime.today()
-    expiry_date = today + timedelta(days=expiry_years * 365)
-    ticker_obj = yf.Ticker(ticker)
-    options = ticker_obj.options
-    if not options:
-        raise ValueError(f"No options data available for ticker {ticker}")
-    option_dates = [datetime.strptime(exp_date, '%Y-%m-%d') for exp_date in options]
-    expiry_date_str = min(option_dates, key=lambda x: abs(x - expiry_date)).strftime('%Y-%m-%d')
-
-    return expiry_date_str
+    return marketdata.closest_expiry(ticker, expiry_years)
 
 def plot_vol_skew(ticker, expiry_years):
-    today = datetime.today()
-    expiry_date = today + timedelta(days=expiry_years * 365)
-
-    ticker_obj = yf.Ticker(ticker)
-    options = ticker_obj.options
-
-    if not options:
-        raise ValueError(f"No options data available for ticker {ticker}")
-
-    option_dates = [datetime.strptime(exp_date, '%Y-%m-%d') for exp_date in options]
-    expiry_date_str = min(option_dates, key=lambda x: abs(x - expiry_date)).strftime('%Y-%m-%d')
+    expiry_date_str = marketdata.closest_expiry(ticker, expiry_years)
 
-    option_chain = ticker_obj.option_chain(date=expiry_date_str)
+    option_chain = marketdata.option_chain(ticker, expiry_date_str)
     calls = option_chain.calls
 
     strikes = calls['strike'].values
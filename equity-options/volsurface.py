@@ -0,0 +1,124 @@
+import numpy as np
+
+import marketdata
+from svi import SVIModel
+from parallel import pool_map
+
+MIN_QUOTES = 5  # an expiry with fewer usable quotes gets no slice
+GRID_LOG_MONEYNESS = np.linspace(-1.0, 1.0, 401)
+GRID_MATURITIES = 128  # log-spaced from one day, plus every listed expiry
+
+# one SVI smile per listed expiry. sigma(K, T) interpolates total implied variance
+# T * vol^2 linearly in T at fixed log-moneyness log(K / S_0) between the two
+# neighbouring slices, and holds the vol of the first and last slice flat outside
+class VolSurface:
+    def __init__(self, S_0, expiries, models):
+        order = np.argsort(expiries)
+        self.S_0 = S_0
+        self.expiries = np.asarray(expiries, dtype=float)[order]
+        self.models = [models[i] for i in order]
+        self.params = np.array([model.params for model in self.models]).T  # a, b, rho, m, sigma rows
+
+    def __len__(self):
+        return len(self.expiries)
+
+    def sigma(self, K, T):
+        k = np.log(np.asarray(K, dtype=float) / self.S_0)
+        T = np.asarray(T, dtype=float)
+        k, T = np.broadcast_arrays(k, T)
+
+        last = len(self.expiries) - 1
+        upper = np.clip(np.searchsorted(self.expiries, T), 1, last) if last else np.zeros(T.shape, dtype=int)
+        lower = np.maximum(upper - 1, 0)
+        T_lo, T_hi = self.expiries[lower], self.expiries[upper]
+        weight = np.clip((T - T_lo) / np.where(T_hi > T_lo, T_hi - T_lo, 1.0), 0, 1)
+
+        w = ((1 - weight) * T_lo * self._variance(k, lower) + weight * T_hi * self._variance(k, upper))
+        T_flat = np.clip(T, self.expiries[0], self.expiries[-1])
+        return np.sqrt(w / T_flat)[()]
+
+    def _variance(self, k, i):
+        a, b, rho, m, sigma = self.params[:, i]
+        return a + b * (rho * (k - m) + np.sqrt((k - m) ** 2 + sigma ** 2))
+
+# the surface sampled once on a log-moneyness x maturity grid; lookups are bilinear
+# interpolation on the grid (constant cost, no SVI evaluation) and flat beyond its edges
+class VolGrid:
+    def __init__(self, S_0, log_moneyness, maturities, vols):
+        self.S_0 = S_0
+        self.log_moneyness = np.asarray(log_moneyness, dtype=float)  # evenly spaced
+        self.maturities = np.asarray(maturities, dtype=float)
+        self.vols = np.asarray(vols, dtype=float)  # maturities x log-moneyness
+        self._dk = self.log_moneyness[1] - self.log_moneyness[0]
+
+    @classmethod
+    def from_surface(cls, surface, log_moneyness=GRID_LOG_MONEYNESS, maturities=None):
+        if maturities is None:
+            dense = np.geomspace(1 / 365, max(2.0, surface.expiries[-1]), GRID_MATURITIES)
+            maturities = np.unique(np.concatenate([dense, surface.expiries]))
+        vols = surface.sigma(surface.S_0 * np.exp(log_moneyness), np.asarray(maturities)[:, None])
+        return cls(surface.S_0, log_moneyness, maturities, vols)
+
+    def sigma(self, K, T):
+        k = np.clip(np.log(np.asarray(K, dtype=float) / self.S_0), self.log_moneyness[0], self.log_moneyness[-1])
+        T = np.clip(np.asarray(T, dtype=float), self.maturities[0], self.maturities[-1])
+        k, T = np.broadcast_arrays(k, T)
+
+        i = np.minimum(((k - self.log_moneyness[0]) / self._dk).astype(int), len(self.log_moneyness) - 2)
+        j = np.clip(np.searchsorted(self.maturities, T) - 1, 0, len(self.maturities) - 2)
+        u = (k - self.log_moneyness[i]) / self._dk
+        v = (T - self.maturities[j]) / (self.maturities[j + 1] - self.maturities[j])
+
+        vols = self.vols
+        return ((1 - v) * ((1 - u) * vols[j, i] + u * vols[j, i + 1])
+                + v * ((1 - u) * vols[j + 1, i] + u * vols[j + 1, i + 1]))[()]
+
+# out-of-the-money quotes on either side of spot: puts below, calls at and above
+def slice_data(chain, S_0):
+    puts = chain.puts[chain.puts['strike'] < S_0]
+    calls = chain.calls[chain.calls['strike'] >= S_0]
+    strikes = np.concatenate([puts['strike'].values, calls['strike'].values]).astype(float)
+    vols = np.concatenate([puts['impliedVolatility'].values, calls['impliedVolatility'].values]).astype(float)
+    valid = np.isfinite(vols) & (vols > 0)
+    return strikes[valid], vols[valid]
+
+def _fit_slice(strikes, vols, S_0):
+    try:
+        return SVIModel().fit(strikes, vols, S_0).params
+    except ValueError:  # calibration failed
+        return None
+
+# calibrates every listed expiry, each independently so the result does not depend
+# on the number of workers (serial unless workers is given, see parallel.pool_map)
+def build_surface(ticker, S_0, workers=None):
+    tasks, maturities = [], []
+    for expiry in marketdata.expiries(ticker):
+        T = marketdata.time_to_expiry(expiry)
+        strikes, vols = slice_data(marketdata.option_chain(ticker, expiry), S_0)
+        if T > 0 and len(strikes) >= MIN_QUOTES:
+            tasks.append((strikes, vols, S_0))
+            maturities.append(T)
+
+    results = pool_map(_fit_slice, tasks, workers)
+
+    fitted = [(T, SVIModel(*params)) for T, params in zip(maturities, results) if params is not None]
+    if not fitted:
+        raise ValueError(f"No expiry of {ticker} could be calibrated")
+    return VolSurface(S_0, [T for T, _ in fitted], [model for _, model in fitted])
+
+# one calibration per ticker and market state (today's live data or the replayed
+# snapshot), around the latest close
+def vol_surface(ticker, workers=None):
+    return marketdata.cache.get("vol_surface", (ticker, marketdata.as_of_key()),
+                                lambda: build_surface(ticker, marketdata.history(ticker)['Close'].iloc[-1], workers))
+
+def vol_grid(ticker):
+    return marketdata.cache.get("vol_grid", (ticker, marketdata.as_of_key()),
+                                lambda: VolGrid.from_surface(vol_surface(ticker)))
+
+# fn(ticker) for vol_surface or vol_grid, or None when no expiry could be calibrated
+def if_calibrated(fn, ticker):
+    try:
+        return fn(ticker)
+    except ValueError:
+        return None
@@ -0,0 +1,68 @@
+import sys
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.append(os.path.abspath("fixed-income"))
+import currentbonds
+from currentbonds import fetch_treasury_curve, treasury_yield, TREASURY_MATURITIES
+
+# a local stand-in for the CNBC quote pages: every tenor quotes a yield, except the
+# failing ones, which return 404
+#-----------------------------------------------------------#
+YIELDS = {maturity: 3 + 0.1 * i for i, maturity in enumerate(TREASURY_MATURITIES)}  # percent
+FAILING = {"20Y"}
+#-----------------------------------------------------------#
+
+class QuotePage(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        QuotePage.requests += 1
+        maturity = self.path.rsplit("US", 1)[-1]
+        if maturity in FAILING or maturity not in YIELDS:
+            self.send_error(404)
+            return
+        body = f'<span class="QuoteStrip-lastPrice">{YIELDS[maturity]:.3f}%</span>'.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server = HTTPServer(("127.0.0.1", 0), QuotePage)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{server.server_port}/quotes/US"
+
+# a failing tenor comes back as None and the rest of the curve is still fetched
+curve = fetch_treasury_curve(base_url, timeout=5)
+for maturity, expected in YIELDS.items():
+    if maturity in FAILING:
+        assert curve.yields[maturity] is None, (maturity, curve.yields[maturity])
+    else:
+        assert abs(curve.yields[maturity] - expected / 100) < 1e-12, (maturity, curve.yields[maturity])
+assert not curve.is_complete()
+print(f"fetched {sum(y is not None for y in curve.yields.values())} of {len(YIELDS)} tenors, 20Y failed")
+
+# the tenors that were fetched still answer
+assert abs(treasury_yield(1, base_url=base_url) - YIELDS["1Y"] / 100) < 1e-12
+print(f"1Y yield: {treasury_yield(1, base_url=base_url):.4%}")
+
+# QUOTE_URL is read when the curve is fetched, not when the module is imported
+currentbonds.QUOTE_URL = base_url
+assert abs(fetch_treasury_curve(timeout=5).rate(5) - YIELDS["5Y"] / 100) < 1e-12
+
+# an incomplete curve is reused for RETRY_TTL instead of refetching all 13 pages per call
+currentbonds.CURVE_CACHE = os.path.join(tempfile.mkdtemp(), "treasury_curve.json")
+QuotePage.requests = 0
+treasury_yield(1)
+treasury_yield(10)
+assert QuotePage.requests == len(YIELDS), QuotePage.requests
+assert not os.path.exists(currentbonds.CURVE_CACHE)  # incomplete curves are not stored
+print(f"two lookups, {QuotePage.requests} page requests")
+
+server.shutdown()
@@ -1,18 +1,91 @@
+import os
+import re
+import json
+import time
+import threading
 import requests
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
 from datetime import datetime
 
-# Get current treasury yields from CNBC
-def treasury_yield(t):
-    url = get_url(t)
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    soup = BeautifulSoup(response.content, 'html.parser')
+TREASURY_MATURITIES = {
+    '1M': 1 / 12,  # 1 month
+    '2M': 2 / 12,  # 2 months
+    '3M': 3 / 12,  # 3 months
+    '4M': 4 / 12,  # 4 months
+    '6M': 6 / 12,  # 6 months
+    '1Y': 1,  # 1 year
+    '2Y': 2,  # 2 years
+    '3Y': 3,  # 3 years
+    '5Y': 5,  # 5 years
+    '7Y': 7,  # 7 years
+    '10Y': 10,  # 10 years
+    '20Y': 20,  # 20 years
+    '30Y': 30  # 30 years
+}
+
+QUOTE_URL = 'https://www.cnbc.com/quotes/US'
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+TIMEOUT = 10  # seconds per request
+CURVE_TTL = 15 * 60  # seconds a fetched curve is reused, in memory and on disk
+RETRY_TTL = 60  # seconds an incomplete curve is reused in memory before refetching
+CURVE_CACHE = os.environ.get("TREASURY_CURVE_CACHE",
+                             os.path.join(os.path.expanduser("~"), ".cache", "financial-engineering", "treasury_curve.json"))
+
+_LAST_PRICE = re.compile(r'class="QuoteStrip-lastPrice"[^>]*>\s*([-+]?\d*\.?\d+)\s*%')
+
+class YieldCurve:
+    def __init__(self, yields, as_of=None):
+        self.yields = dict(yields)  # {maturity: yield}
+        self.as_of = as_of if as_of is not None else time.time()
+
+    # yield of the listed maturity closest to t years
+    def rate(self, t):
+        return self.yields.get(closest_maturity(t))
+
+    def is_complete(self):
+        return all(self.yields.get(maturity) is not None for maturity in TREASURY_MATURITIES)
+
+_session = None
+_session_lock = threading.Lock()
+_curve = None
+_replay = False
+
+# one pooled session shared by every request, retrying transient failures; the
+# fetch workers race to create it, so creation is locked
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=len(TREASURY_MATURITIES), max_retries=retries)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+# serve treasury yields from a saved curve instead of CNBC (None goes back to live).
+# A replayed curve never touches the network, even when it is empty
+def replay_curve(curve):
+    global _curve, _replay
+    _replay = curve is not None
+    _curve = YieldCurve(curve) if curve is not None else None
+
+# the last price sits in a fixed span of the quote strip; fall back to a full parse
+def parse_yield(html):
+    match = _LAST_PRICE.search(html)
+    if match:
+        return float(match.group(1)) / 100
+
+    soup = BeautifulSoup(html, 'html.parser')
     container = soup.find('div', class_='QuoteStrip-lastPriceStripContainer')
     if container:
         yield_element = container.find('span', class_='QuoteStrip-lastPrice')
@@ -26,37 +99,84 @@ def treasury_yield(t):
         print("Yield container not found.")
         return None
 
+# None when the page cannot be fetched, like a page that cannot be parsed, so one
+# failing tenor does not sink the rest of the curve
+def _fetch_yield(maturity, base_url, timeout):
+    try:
+        response = _get_session().get(base_url + maturity, timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException as error:
+        print(f"Could not fetch the {maturity} yield: {error}")
+        return None
+    return parse_yield(response.text)
+
+# every maturity at once over the pooled session; base_url defaults to QUOTE_URL as it is when called
+def fetch_treasury_curve(base_url=None, timeout=TIMEOUT):
+    base_url = QUOTE_URL if base_url is None else base_url
+    maturities = list(TREASURY_MATURITIES)
+    with ThreadPoolExecutor(max_workers=len(maturities)) as pool:
+        yields = pool.map(lambda maturity: _fetch_yield(maturity, base_url, timeout), maturities)
+        return YieldCurve(zip(maturities, yields))
+
+def _load_curve(max_age):
+    try:
+        with open(CURVE_CACHE) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - saved["as_of"] >= max_age:
+        return None
+    return YieldCurve(saved["yields"], saved["as_of"])
+
+def _store_curve(curve):
+    try:
+        os.makedirs(os.path.dirname(CURVE_CACHE), exist_ok=True)
+        with open(CURVE_CACHE + ".tmp", "w") as f:
+            json.dump({"as_of": curve.as_of, "yields": curve.yields}, f)
+        os.replace(CURVE_CACHE + ".tmp", CURVE_CACHE)
+    except OSError:
+        pass
+
+# current curve: replayed, cached in memory, cached on disk, or fetched. Incomplete
+# curves are kept in memory for at most RETRY_TTL and never written to disk. A curve
+# from another base_url is always fetched and never cached
+def treasury_curve(max_age=CURVE_TTL, base_url=None):
+    global _curve
+    if _replay:
+        return _curve
+    if base_url is not None:
+        return fetch_treasury_curve(base_url)
+    if _curve is not None:
+        age_limit = max_age if _curve.is_complete() else min(max_age, RETRY_TTL)
+        if time.time() - _curve.as_of < age_limit:
+            return _curve
+
+    curve = _load_curve(max_age)
+    if curve is None:
+        curve = fetch_treasury_curve()
+        if curve.is_complete():
+            _store_curve(curve)
+    _curve = curve
+    return curve
+
+# Get current treasury yields from CNBC
+def treasury_yield(t, base_url=None):
+    rate = treasury_curve(base_url=base_url).rate(t)
+    if rate is None and _replay:
+        raise ValueError(f"The replayed treasury curve has no {closest_maturity(t)} yield")
+    return rate
+
+def closest_maturity(t):
+    return min(TREASURY_MATURITIES.keys(), key=lambda k: abs(TREASURY_MATURITIES[k] - t))
+
 def get_url(t):
-    times = {
-        '1M': 1 / 12,  # 1 month
-        '2M': 2 / 12,  # 2 months
-        '3M': 3 / 12,  # 3 months
-        '4M': 4 / 12,  # 4 months
-        '6M': 6 / 12,  # 6 months
-        '1Y': 1,  # 1 year
-        '2Y': 2,  # 2 years
-        '3Y': 3,  # 3 years
-        '5Y': 5,  # 5 years
-        '7Y': 7,  # 7 years
-        '10Y': 10,  # 10 years
-        '20Y': 20,  # 20 years
-        '30Y': 30  # 30 years
-    }
-    closest = min(times.keys(), key=lambda k: abs(times[k] - t))
-    return 'https://www.cnbc.com/quotes/US' + closest
+    return QUOTE_URL + closest_maturity(t)
 
 # Method to plot the current yield curve
 def plot_yield_curve():
-    maturities = ['1M', '2M', '3M', '4M', '6M', '1Y', '2Y', '3Y', '5Y', '7Y', '10Y', '20Y', '30Y']
-    times = [1 / 12, 2 / 12, 3 / 12, 4 / 12, 6 / 12, 1, 2, 3, 5, 7, 10, 20, 30]
-    yields = []
-
-    for maturity in maturities:
-        yield_value = treasury_yield(times[maturities.index(maturity)])
-        if yield_value is not None:
-            yields.append(yield_value)
-        else:
-            yields.append(0)  # Append 0 if the yield is not found
+    curve = treasury_curve()
+    maturities = list(curve.yields)
+    yields = [yield_value if yield_value is not None else 0 for yield_value in curve.yields.values()]  # 0 if the yield is not found
 
     # Get today's date
     today = datetime.today().strftime('%Y-%m-%d')
@@ -1,6 +1,7 @@
 import sys
 import os
 import datetime
+import argparse
 
 sys.path.append(os.path.abspath("equity-options"))
 sys.path.append(os.path.abspath("fixed-income"))
@@ -9,7 +10,8 @@ from optionstrategies import OptionStrategy
 from exotics import DigitalOption, SinglePeriodRangeAccrual, AsianOption
 from option import Option
 from bonds import Bond, ZeroCouponBond, ZeroCouponBondOption, Caplet, Floorlet
-from currentbonds import treasury_yield, plot_yield_curve
+from currentbonds import treasury_yield, plot_yield_curve, treasury_curve, replay_curve
+from marketdata import capture_snapshot, save_snapshot, use_snapshot
 
 def main():
     while True:
@@ -176,5 +178,25 @@ def handle_fixed_income():
     else:
         print("Invalid choice. Returning to main menu.")
 
+def capture(path, tickers):
+    snapshot = capture_snapshot(tickers, treasury_curve().yields)
+    save_snapshot(snapshot, path)
+    print(f"Saved market-data snapshot of {', '.join(tickers)} to {path}")
+
+def replay(path):
+    snapshot = use_snapshot(path)
+    replay_curve(snapshot.treasury_curve)
+    print(f"Replaying market data from {path} (taken {snapshot.as_of:%Y-%m-%d %H:%M})")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", metavar="PATH", help="replay market data from a snapshot instead of the network")
+    parser.add_argument("--capture", nargs="+", metavar=("PATH", "TICKER"), help="save a market-data snapshot of the tickers and exit")
+    args = parser.parse_args()
+
+    if args.capture:
+        capture(args.capture[0], args.capture[1:])
+    else:
+        if args.snapshot:
+            replay(args.snapshot)
+        main()
\ No newline at end of file